@@ -0,0 +1,269 @@
+import os
+import time
+import selectors
+import threading
+import collections
+import numpy as np
+import serial
+from sample_decode import as_array
+
+#Created By: Team E14
+#Background serial acquisition so the menu never stalls the serial reads
+
+class RingBuffer():
+    # Fixed size byte ring shared between the reader thread (writer) and the menu (reader).
+    # It has the same read/in_waiting/reset_input_buffer calls as serial.Serial so anything
+    # that reads from the port can read from the ring instead.
+    def __init__(self, capacity=8*1024*1024, timeout=None):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.buffer = np.zeros(capacity, dtype=np.uint8)
+
+        self.write_count = 0 #total bytes ever written
+        self.read_count = 0 #total bytes ever read
+        self.overruns = 0 #number of writes that did not fit
+        self.bytes_dropped = 0
+        self.max_fill = 0
+        self.closed = False
+        self.gaps = 0 #times the connection was lost mid stream
+        self.__gaps = collections.deque() #stream positions (write_count) where the connection was lost
+        self.__after_gap = False #the last read returned the first bytes after a gap
+        self.__interrupted = False #reads return straight away until resume()
+
+        self.lock = threading.Lock()
+        self.data_ready = threading.Condition(self.lock)
+
+    @property
+    def in_waiting(self):
+        with self.lock:
+            return self.write_count - self.read_count
+
+    def write(self, data):
+        data = np.frombuffer(data, dtype=np.uint8)
+        with self.lock:
+            free = self.capacity - (self.write_count - self.read_count)
+            start = self.write_count % self.capacity
+        if len(data) > free: #consumer has fallen behind, keep what is already queued
+            self.overruns += 1
+            self.bytes_dropped += len(data) - free
+            data = data[:free]
+
+        # only the writer touches the free region so the copy can happen outside the lock
+        first = min(len(data), self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+
+        with self.data_ready:
+            self.write_count += len(data)
+            self.max_fill = max(self.max_fill, self.write_count - self.read_count)
+            self.data_ready.notify_all()
+
+    def mark_gap(self):
+        # Called by the writer when the connection drops, the bytes either side are not continuous
+        with self.data_ready:
+            self.__gaps.append(self.write_count)
+            self.gaps += 1
+            self.data_ready.notify_all()
+
+    def interrupt(self):
+        # Makes reads return straight away with whatever is queued, even nothing, until resume() or
+        # reset_input_buffer(). Used by the stall watchdog so a capture is not left blocked forever.
+        with self.data_ready:
+            self.__interrupted = True
+            self.data_ready.notify_all()
+
+    def resume(self):
+        with self.lock:
+            self.__interrupted = False
+
+    def take_gap(self):
+        # True once for the first read after a gap, so the reader can drop any partial frame from before it
+        with self.lock:
+            after_gap, self.__after_gap = self.__after_gap, False
+            return after_gap
+
+    def read(self, size=1):
+        # Blocks until size bytes are queued, the timeout passes or the ring is closed.
+        # A read never spans a gap, it stops short at the gap and the next read starts after it.
+        size = min(size, self.capacity // 2) #never wait on more than the ring can hold
+        with self.data_ready:
+            while True:
+                while len(self.__gaps) != 0 and self.__gaps[0] <= self.read_count:
+                    self.__gaps.popleft()
+                    self.__after_gap = True
+                self.data_ready.wait_for(lambda: self.write_count - self.read_count >= size or self.closed or self.__interrupted or
+                                         (len(self.__gaps) != 0 and self.__gaps[0] - self.read_count < size), self.timeout)
+                if self.closed or self.__interrupted or len(self.__gaps) == 0 or self.__gaps[0] > self.read_count:
+                    break
+                #reached a gap with nothing read before it, wait for the data after it
+            size = min(size, self.write_count - self.read_count)
+            if len(self.__gaps) != 0:
+                size = min(size, self.__gaps[0] - self.read_count)
+            start = self.read_count % self.capacity
+            first = min(size, self.capacity - start)
+            data = self.buffer[start:start + first].tobytes() + self.buffer[:size - first].tobytes()
+            self.read_count += size
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        # Throws away what is queued, and with it the overruns that happened while nobody was reading
+        with self.lock:
+            self.read_count = self.write_count
+            self.overruns = 0
+            self.bytes_dropped = 0
+            self.max_fill = 0
+            self.__gaps.clear()
+            self.__after_gap = False
+            self.__interrupted = False
+
+    def close(self):
+        with self.data_ready:
+            self.closed = True
+            self.data_ready.notify_all()
+
+class SerialReader():
+    # Drains the serial port continuously into a RingBuffer from its own thread. With a
+    # ConnectionSupervisor a lost connection is reopened and marked as a gap in the ring
+    # instead of ending the capture.
+    # Where the port has a file descriptor (Linux and macOS) the thread sleeps in select/poll until
+    # bytes arrive and then reads everything queued in one call. When only a little is queued it waits
+    # up to latency seconds, going by the byte rate seen so far, so a slow stream like the 5 kHz legacy
+    # one is read in batches and not a few bytes per wake. Other ports fall back to blocking reads.
+    def __init__(self, ser, capacity=8*1024*1024, supervisor=None, latency=0.005):
+        self.ser = ser
+        self.supervisor = supervisor
+        self.buffer = RingBuffer(capacity)
+        self.latency = latency #longest a byte waits on the port before it reaches the ring
+        self.running = False
+        self.thread = None
+        self.error = None #set if the port failed and reading stopped
+
+        self.byte_rate = 0.0 #smoothed bytes per second arriving on the port
+        self.wakeups = 0 #reads made, divide by the capture time for reads per second
+        self.__selector = None
+        self.__selected = None #the port the selector is watching, it changes on a reconnect
+        self.__wake_read, self.__wake_write = None, None #pipe that wakes the selector in stop()
+        self.__last_read = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.__wake_write is not None:
+            try:
+                os.write(self.__wake_write, b"\0")
+            except OSError:
+                pass
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        if self.thread is None or not self.thread.is_alive():
+            for fd in (self.__wake_read, self.__wake_write):
+                if fd is not None:
+                    os.close(fd)
+            self.__wake_read = self.__wake_write = None
+        self.buffer.close()
+
+    def __watch(self):
+        # Selector over the current port and the wake pipe, or None if the port has no file descriptor
+        if self.__selected is self.ser:
+            return self.__selector
+        if self.__selector is not None:
+            self.__selector.close()
+        self.__selector = None
+        self.__selected = self.ser
+        try:
+            fd = self.ser.fileno()
+        except (AttributeError, OSError, ValueError, serial.SerialException):
+            return None #e.g. Windows, where pyserial uses overlapped IO instead
+        if self.__wake_read is None:
+            self.__wake_read, self.__wake_write = os.pipe()
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(fd, selectors.EVENT_READ)
+        self.__selector.register(self.__wake_read, selectors.EVENT_READ)
+        return self.__selector
+
+    def __read(self):
+        selector = self.__watch()
+        if selector is None:
+            return self.ser.read(max(self.ser.in_waiting, 1))
+        ready = [key.fd for key, _ in selector.select()]
+        if self.__wake_read in ready:
+            os.read(self.__wake_read, 64)
+            return b""
+        waiting = self.ser.in_waiting
+        target = self.byte_rate * self.latency
+        if waiting < target: #let a batch build up rather than waking for every few bytes
+            time.sleep(min(self.latency, (target - waiting) / self.byte_rate))
+            waiting = self.ser.in_waiting
+        #at least one byte, a readable port with nothing to read has been unplugged and raises here
+        data = self.ser.read(max(waiting, 1))
+        now = time.monotonic()
+        if self.__last_read is not None and now > self.__last_read:
+            self.byte_rate += 0.2 * (len(data) / (now - self.__last_read) - self.byte_rate)
+        self.__last_read = now
+        self.wakeups += 1
+        return data
+
+    def __run(self):
+        try:
+            while self.running:
+                try:
+                    data = self.__read()
+                except (serial.SerialException, OSError) as error:
+                    if self.supervisor is None:
+                        raise
+                    self.buffer.mark_gap()
+                    self.ser = self.supervisor.reconnect(lambda: self.running)
+                    if self.ser is None: #stopped while reconnecting
+                        raise error
+                    self.__last_read = None
+                    continue
+                if len(data) != 0:
+                    self.buffer.write(data)
+        except (serial.SerialException, OSError) as error:
+            self.error = error
+            self.running = False
+        finally:
+            if self.__selector is not None:
+                self.__selector.close()
+            self.__selector = self.__selected = None
+            self.buffer.close()
+
+class CaptureBuffer():
+    # Raw recording bytes held in one preallocated uint8 array instead of a list of ints.
+    # Grows in large chunks when the recording length is not known up front (distance mode).
+    # Other dtypes can be used for decoded or filtered samples.
+    def __init__(self, capacity=0, chunk_size=44100*2*60, dtype=np.uint8):
+        self.chunk_size = chunk_size
+        self.data = np.empty(capacity, dtype=dtype)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, capacity):
+        if capacity > len(self.data):
+            data = np.empty(capacity, dtype=self.data.dtype)
+            data[:self.length] = self.data[:self.length]
+            self.data = data
+
+    def append(self, data):
+        data = as_array(data).reshape(-1)
+        if self.length + len(data) > len(self.data):
+            self.reserve(self.length + max(len(data), self.chunk_size, len(self.data) // 2))
+        self.data[self.length:self.length + len(data)] = data
+        self.length += len(data)
+
+    def view(self):
+        return self.data[:self.length]
+
+    def clear(self):
+        self.length = 0
@@ -2,9 +2,20 @@ import numpy as np
 import wave
 import serial
 import serial.tools.list_ports
-import matplotlib.pyplot as plt
-import csv
-from scipy.signal import butter, filtfilt
+from acquisition import SerialReader, CaptureBuffer
+from sample_decode import decode_samples, SampleDecoder
+from streaming_filter import StreamingFilter, zero_phase_filter, capture_settings
+from exporters import StreamingWavWriter, StreamingCsvWriter
+from waveform import save_waveform, WaveformEnvelope
+from export_worker import ExportWorker, RecordingSnapshot
+from capture import CaptureController, PreRollBuffer
+from session import SegmentSession
+from capture_file import CaptureFileWriter
+from protocol_probe import FRAMED, probe
+from spool import SpoolBuffer
+from recover import find_interrupted, set_aside
+from connection import ConnectionSupervisor
+from watchdog import StallWatchdog, SamplerStalled
 
 #Created By: Team E14
 #Created Date: 1/05/25
@@ -18,10 +29,36 @@ class Menu():
         self.SAMPLE_RATE = 44100
         self.BAUD_RATE = 921600
         self.zero_count_end = 100
+        self.pre_roll_seconds = 2 #audio kept from before the distance trigger fires
         self.ser = None
+        self.reader = None
+        self.supervisor = None #reopens the port if the board is unplugged mid capture
+        #a capture counts the sampler as stalled after 2 s without a new frame (decoded or still queued),
+        #then reads stop blocking so the capture loop can deal with it
+        self.watchdog = StallWatchdog(lambda: self.decoder.frames_decoded + self.stream.in_waiting // self.decoder.frame_size,
+                                      deadline=2.0, on_stall=lambda stall: self.stream.interrupt())
+        self.stream = None #ring buffer filled by the reader thread
         self.start_bit_1 = 255
         self.start_bit_2 = 255
         self.buffer_size = 512
+        self.bytes_per_sample = 2
+        self.auto_detect_protocol = True #probe the port for the legacy 8-bit stream before capturing
+        self.check_policy = "conceal" #what happens to frames that fail their check byte: "drop", "conceal" or "flag"
+        self.use_protocol(FRAMED)
+        self.zero_phase_export = False #True to filtfilt the whole recording at save time instead
+        self.wav_sink = None
+        self.csv_sink = None
+        self.raw_sink = None
+        self.save_raw_capture = True #also keep every frame in a .e14raw file so it can be reprocessed later
+        self.journal_sync_frames = 256 #the .e14raw file doubles as a crash journal, forced to disk every this many frames
+        self.journal_sync_seconds = 0.5 #or this often, whichever comes first
+        self.exporter = ExportWorker(max_pending=2)
+        self.session = None #set while an unattended distance session is running
+        self.segment_name = "E14_44_1ksps" #file name (no extension) for the recording in progress
+        self.segment_start = 0 #first sample of the recording, counted from when capture was armed
+        self.spool_recordings = True #keep recordings in memory mapped files on disk instead of RAM
+        self.spool_folder = None #where spool files go, default the system temp folder
+        self.counters_at_start = {} #running totals when the recording started, warnings only cover this recording
 
         self.menu_options = ["Mode Select", "Format Select","Change Recording Length"]
         self.menu_functions = [self.mode_select, self.format_select, self.set_record_len]
@@ -33,17 +70,20 @@ class Menu():
         self.manual_options = ["Start Recording","Back to Main menu"]
         self.manual_functions = [self.record_audio, self.main_menu]
 
-        self.dist_trig_options = ["Active Distance Trigger Mode", "Back to Main menu"]
-        self.dist_trig_functions = [self.record_audio, self.main_menu]
+        self.dist_trig_options = ["Active Distance Trigger Mode", "Start Continuous Session", "Back to Main menu"]
+        self.dist_trig_functions = [self.record_audio, self.record_session, self.main_menu]
 
         
-        self.unprocessed_audio_data = []
+        self.unprocessed_audio_data, self.streamed_filtered_data = self.__new_buffers()
         self.processed_audio_data = []
         self.filtered_data = []
 
     def default(self):
         self.current_format = self.formats[0] #default to .wav
         self.record_length = 5
+        interrupted = find_interrupted()
+        if len(interrupted) != 0:
+            print(f"{len(interrupted)} recording(s) were interrupted before saving, rebuild them with: python recover.py")
         self.main_menu()
 
     def main_menu(self):
@@ -67,7 +107,33 @@ class Menu():
             print(device.device)
             if "STM" in str(device):
                 stm = device.device
-        self.ser = serial.Serial(stm, self.BAUD_RATE)
+        self.supervisor = ConnectionSupervisor(self.BAUD_RATE)
+        self.ser = self.supervisor.open(stm)
+        if self.auto_detect_protocol:
+            result = probe(self.ser)
+            if result.protocol is not None:
+                self.use_protocol(result.protocol)
+                print(f"Detected {result.protocol}")
+            else:
+                print(f"Could not identify the stream ({result.bytes_read} bytes at {result.byte_rate:.0f} B/s), assuming {self.protocol}")
+        self.supervisor.baud_rate = self.ser.baudrate #reconnect at whatever rate the probe settled on
+        self.reader = SerialReader(self.ser, supervisor=self.supervisor)
+        self.reader.start()
+        self.stream = self.reader.buffer
+
+    def use_protocol(self, protocol):
+        # Sets up decoding, filtering and the streamed .wav for the wire format the board is sending
+        self.protocol = protocol
+        self.SAMPLE_RATE = protocol.sample_rate
+        self.BAUD_RATE = protocol.baud_rate
+        self.buffer_size = protocol.payload_size
+        self.bytes_per_sample = protocol.bytes_per_sample
+        self.decoder = protocol.decoder(self.check_policy)
+        self.capture_controller = CaptureController(self.decoder, self.SAMPLE_RATE, self.bytes_per_sample)
+        self.pre_roll = PreRollBuffer(self.pre_roll_seconds, self.SAMPLE_RATE, self.buffer_size, self.bytes_per_sample)
+        self.sample_decoder = SampleDecoder(self.bytes_per_sample)
+        self.filter_band, self.wav_gain = capture_settings(self.SAMPLE_RATE, self.bytes_per_sample) #wav_gain scales the streamed .wav
+        self.stream_filter = StreamingFilter(*self.filter_band, self.SAMPLE_RATE)
 
     def distance_trig_menu(self):
         print("---------- DISTANCE TRIGGER MODE ----------")
@@ -137,81 +203,208 @@ class Menu():
 
     def record_audio(self):
         if self.current_mode == self.modes[0]: #manual recording
-            for _ in range(0, int(self.record_length*self.SAMPLE_RATE/self.buffer_size*2.1)):
-                while True:
-                    start1 = self.ser.read(1)[0]
-                    if start1 == self.start_bit_1:
-                        start2 = self.ser.read(1)[0]
-                        if start2 == self.start_bit_2:
-                            self.ser.read(2) #read in the in_range bi1t
-                            buffer = self.ser.read(self.buffer_size)
-                            self.unprocessed_audio_data.extend(buffer)
-                            break
+            self.stream.reset_input_buffer()
+            self.decoder.reset()
+            self.__open_sinks()
+            self.unprocessed_audio_data.reserve(self.record_length*self.SAMPLE_RATE*self.bytes_per_sample)
+            #decode and filter each read while the rest is still arriving, stopping on the exact sample count
+            with self.watchdog:
+                samples = self.capture_controller.record(self.stream, self.record_length, self.__capture)
+                try:
+                    self.watchdog.check()
+                except SamplerStalled as stall:
+                    print(f"Warning: {stall}, keeping what was recorded")
+            print(f"Captured {samples} samples in {self.capture_controller.elapsed:.2f} s ({self.capture_controller.achieved_rate:.0f} Hz achieved)")
 
             self.save_recording()
+            print("Recording Saved!")
+            self.__report_overruns()
+            self.manual_record_menu() #ready to record again while the last one saves
 
         elif self.current_mode == self.modes[1]: #distance trig mode
             one_count = 0
             zero_count = 0
             first_activation = True
-            self.ser.reset_input_buffer()
+            samples_received = 0 #since arming, gives each segment its start sample
+            self.stream.reset_input_buffer()
+            self.decoder.reset()
+            self.pre_roll.clear()
+            self.watchdog.start() #stopped again before handing back to the menu
             while True:
-                start1 = self.ser.read(1)[0]
-                if start1 == self.start_bit_1:
-                    start2 = self.ser.read(1)[0]
-                    if start2 == self.start_bit_2:
-                        in_range = self.ser.read(1)[0] #check if data is valid (was ultrasonic in range)
-                        self.ser.read(1)
-                        buffer = self.ser.read(self.buffer_size) #read the data after the range check
-
-                        if in_range == 1: #in range
-                            if one_count >= 75:
-                                first_activation = False
-                                self.unprocessed_audio_data.extend(buffer) #append data to list
-                            else:
-                                one_count += 1
-                            
-                        elif in_range == 0: #out of range
-                            if first_activation == False:
-                                zero_count += 1
-                                self.unprocessed_audio_data.extend(buffer)
-                                if zero_count == self.zero_count_end:
-                                    while True:
-                                        keep_going = input("\nOut of Range: Would you like to save the recording (Y/N): ")
-                                        if keep_going == "Y" or keep_going == "y":
-                                            self.save_recording()
-                                            return
-                                        elif keep_going == "N" or keep_going == "n":
-                                            zero_count = 0
-                                            one_count = 0
-                                            first_activation = True
-                                            self.unprocessed_audio_data.clear() #delete all current data
-                                            self.ser.reset_input_buffer() #
-                                            break
-                                        else:
-                                            print("Invalid Input")
-                                            pass
-
-        print("Recording Saved!")
+                payloads, in_range_flags = self.decoder.read_frames(self.stream) #read every frame waiting on the port
+                arrival, resync, corrupt = self.decoder.last_arrival, self.decoder.last_resync, self.decoder.last_corrupt
+                if len(payloads) == 0: #woken by the watchdog or the port closed
+                    try:
+                        self.watchdog.check()
+                    except SamplerStalled as stall:
+                        print(f"\nWarning: {stall}")
+                        self.stream.resume() #stay armed, waiting for the sampler to come back
+                        if not first_activation: #the sampler stopped mid recording, keep what there is
+                            self.save_recording()
+                            print("Recording Saved!")
+                            self.__report_overruns()
+                            one_count = 0
+                            zero_count = 0
+                            first_activation = True
+                            if self.session is None:
+                                self.watchdog.stop()
+                                self.distance_trig_menu()
+                                return
+                if self.decoder.payload_size != self.buffer_size: #board sends a different frame size than expected
+                    self.__payload_size_changed()
+                for i, (buffer, in_range) in enumerate(zip(payloads, in_range_flags)): #in_range checks if data is valid (was ultrasonic in range)
+                    samples_received += len(buffer) // self.bytes_per_sample
+                    if in_range == 1: #in range
+                        if one_count >= 75:
+                            if first_activation: #trigger fired, start the recording with the pre-roll
+                                self.segment_start = samples_received - (len(buffer) + len(self.pre_roll)) // self.bytes_per_sample
+                                if self.session is not None:
+                                    self.segment_name = self.session.new_segment()
+                                self.__open_sinks()
+                                self.__capture(np.concatenate(self.pre_roll.contents()), *self.pre_roll.metadata())
+                                self.pre_roll.clear()
+                            first_activation = False
+                            self.__capture(buffer, in_range, arrival[i], resync[i], corrupt[i]) #append data to the capture buffer
+                        else:
+                            one_count += 1
+                            self.pre_roll.push(buffer, in_range, arrival[i], resync[i], corrupt[i])
+
+                    elif in_range == 0: #out of range
+                        if first_activation == True:
+                            self.pre_roll.push(buffer, in_range, arrival[i], resync[i], corrupt[i])
+                        else:
+                            zero_count += 1
+                            self.__capture(buffer, in_range, arrival[i], resync[i], corrupt[i])
+                            if zero_count == self.zero_count_end and self.session is not None:
+                                #unattended session, save the segment and re-arm without flushing the port
+                                self.save_recording()
+                                print(f"Segment {self.session.segment_count} recorded")
+                                self.__report_overruns()
+                                zero_count = 0
+                                one_count = 0
+                                first_activation = True
+                            elif zero_count == self.zero_count_end:
+                                while True:
+                                    keep_going = input("\nOut of Range: Would you like to save the recording (Y/N): ")
+                                    if keep_going == "Y" or keep_going == "y":
+                                        self.save_recording()
+                                        print("Recording Saved!")
+                                        self.__report_overruns()
+                                        self.watchdog.stop()
+                                        self.distance_trig_menu() #ready to re-arm while the last one saves
+                                        return
+                                    elif keep_going == "N" or keep_going == "n":
+                                        zero_count = 0
+                                        one_count = 0
+                                        first_activation = True
+                                        self.__clear_data() #delete all current data
+                                        self.stream.reset_input_buffer() #
+                                        self.decoder.reset()
+                                        self.pre_roll.clear()
+                                        break
+                                    else:
+                                        print("Invalid Input")
+                                        pass
+                                break #drop the rest of this read, it was flushed with the port
+
+    def record_session(self):
+        # Distance trigger mode without the prompts, runs until Ctrl+C
+        self.session = SegmentSession(self.SAMPLE_RATE)
+        print(f"Session started, saving segments to {self.session.folder} (Ctrl+C to stop)")
+        try:
+            self.record_audio()
+        except KeyboardInterrupt:
+            if len(self.unprocessed_audio_data) != 0: #keep the segment that was still recording
+                self.save_recording()
+        finally:
+            self.watchdog.stop()
+            self.exporter.wait()
+            self.session.close()
+            print(f"\nSession ended, {len(self.session.segments)} segments listed in {self.session.manifest_path}")
+            self.session = None
+            self.segment_name = "E14_44_1ksps"
+        self.distance_trig_menu()
+
+    def __payload_size_changed(self):
+        # The pre-roll holds whole frames, so it is rebuilt at the new size (losing what it held)
+        self.buffer_size = self.decoder.payload_size
+        self.pre_roll = PreRollBuffer(self.pre_roll_seconds, self.SAMPLE_RATE, self.buffer_size, self.bytes_per_sample)
+
+    def __counters(self):
+        # Running totals kept for the whole session, __report_overruns reports how much each changed during a recording
+        counters = {"overruns": self.stream.overruns, "bytes_dropped": self.stream.bytes_dropped, "gaps": self.decoder.gaps,
+                    "downtime": 0 if self.supervisor is None else self.supervisor.downtime}
+        checker = self.decoder.checker
+        if checker is not None:
+            counters.update(frames_corrupt=checker.frames_corrupt, frames_checked=checker.frames_checked)
+        return counters
+
+    def __report_overruns(self):
+        changed = {name: value - self.counters_at_start.get(name, 0) for name, value in self.__counters().items()}
+        if changed["overruns"] != 0:
+            print(f"Warning: {changed['bytes_dropped']} bytes dropped in {changed['overruns']} buffer overruns")
+        if changed["gaps"] != 0:
+            print(f"Warning: the board was reconnected {changed['gaps']} time(s), {changed['downtime'] * 1000:.0f} ms of audio is missing")
+        checker = self.decoder.checker
+        if checker is not None and changed["frames_corrupt"] != 0:
+            print(f"Warning: {changed['frames_corrupt']} of {changed['frames_checked']} frames failed their {checker.method} check ({checker.policy})")
+
+    def __capture(self, payloads, in_range, arrival, resync, corrupt=False):
+        self.unprocessed_audio_data.append(payloads)
+        if self.raw_sink is not None:
+            self.raw_sink.write(payloads, in_range, arrival, resync, corrupt) #concealed frames stay marked for reprocessing
+        samples = self.sample_decoder.decode(payloads)
+        if self.csv_sink is not None:
+            self.csv_sink.write(samples)
+        if not self.zero_phase_export: #filter each frame as it arrives
+            filtered = self.stream_filter.process(samples)
+            self.streamed_filtered_data.append(filtered)
+            if self.wav_sink is not None:
+                self.wav_sink.write(filtered * self.wav_gain)
+
+    def __open_sinks(self):
+        # Exports that can be written while recording are opened as soon as capture starts
+        self.counters_at_start = self.__counters()
+        moved = set_aside(self.segment_name) #a crashed recording of the same name would be truncated
+        if moved is not None:
+            print(f"The last {self.segment_name} recording was interrupted, its files were renamed to {moved}, rebuild it with: python recover.py")
+        if self.current_format == self.formats[0] and not self.zero_phase_export:
+            self.wav_sink = StreamingWavWriter(self.segment_name + ".wav", self.SAMPLE_RATE)
+        elif self.current_format == self.formats[2]:
+            self.csv_sink = StreamingCsvWriter(self.segment_name + ".csv")
+        if self.save_raw_capture:
+            self.raw_sink = CaptureFileWriter(self.segment_name + ".e14raw", self.SAMPLE_RATE, self.buffer_size, bytes_per_sample=self.bytes_per_sample,
+                                              sync_frames=self.journal_sync_frames, sync_interval=self.journal_sync_seconds)
 
     def __process_raw_data(self):
-        # Convert the received data to 12-bit values
-        data = np.array(self.unprocessed_audio_data, dtype=np.uint8)
-        # Reconstruct 12-bit values from the 16-bit chunks (LSB + MSB)
-        for i in range(0, len(data), 2):  # Process two bytes (16 bits) per sample
-            lsb = int(data[i])
-            msb = int(data[i+1])
-            # Combine the LSB and MSB to get a 12-bit sample (only lower 12 bits)
-            sample = ((msb & 0x0F) << 8) | lsb  # The 4 MSB bits are discarded
-            self.processed_audio_data.append(sample)
-        self.processed_audio_data = np.array(self.processed_audio_data)
+        # Convert the received data to 12-bit values (LSB + MSB, the 4 MSB bits are discarded)
+        self.processed_audio_data = decode_samples(np.asarray(self.unprocessed_audio_data.view()), self.bytes_per_sample)
 
     def butter_filter(self, data, lowcut, highcut, sample_rate, filter_type="bandpass", order=5):
-        nyquist = 0.5 * sample_rate
-        low = lowcut / nyquist
-        high = highcut / nyquist
-        b, a = butter(order, [low, high], btype=filter_type, analog=False)
-        return filtfilt(b, a, data)
+        return zero_phase_filter(data, lowcut, highcut, sample_rate, filter_type, order)
+
+    def __sample_chunks(self, recording, chunk_size=1 << 20):
+        # The recording's samples a chunk at a time, so a spooled recording is never read back whole
+        step = chunk_size * recording.bytes_per_sample
+        for start in range(0, len(recording.raw), step):
+            yield decode_samples(recording.raw[start:start + step], recording.bytes_per_sample)
+
+    def __sample_range(self, recording):
+        # Lowest and highest sample, in one pass
+        ranges = np.array([(chunk.min(), chunk.max()) for chunk in self.__sample_chunks(recording)])
+        return ranges[:, 0].min(), ranges[:, 1].max()
+
+    def __filtered_chunks(self, recording, low, scale, chunk_size=1 << 20):
+        # The filtered recording scaled to 16-bit, a chunk at a time. The band pass removes the offset, so
+        # scaling the streamed output matches filtering the scaled samples. A zero phase filter runs
+        # forwards and backwards over the whole recording, so that one is done in memory.
+        count = len(recording.raw) // recording.bytes_per_sample
+        if recording.zero_phase or len(recording.streamed_filtered) != count:
+            samples = ((decode_samples(np.asarray(recording.raw), recording.bytes_per_sample) - low) * scale).astype(np.uint16)
+            yield self.butter_filter(samples, *recording.filter_band, recording.sample_rate, filter_type="bandpass")
+            return
+        for start in range(0, count, chunk_size):
+            yield recording.streamed_filtered[start:start + chunk_size] * scale
 
     def save_all(self):
         self.__process_raw_data()
@@ -231,26 +424,14 @@ class Menu():
             print("Saved as E14_44_1ksps.wav")
 
         
-            time_axis = np.arange(len(self.filtered_data)) / self.SAMPLE_RATE
-            plt.figure(figsize=(12, 4))
-            plt.plot(time_axis, self.filtered_data, color='blue')
-            plt.title("Filtered ADC Waveform (16-bit Depth)")
-            plt.xlabel("Time (s)")
-            plt.ylabel("Amplitude (16-bit)")
-            plt.grid(True)
-            plt.tight_layout()
-            plt.savefig("E14_44_1ksps.png")
-            plt.close()
+            save_waveform("E14_44_1ksps.png", self.filtered_data, self.SAMPLE_RATE) #min/max per pixel column
             print("Saved as: E14_44_1ksps.png")
 
             # Save raw signal as .npy for later filtering
-            np.save("filtered_signal16bit.npy", self.filtered_data)
+            np.save("filtered_signal16bit.npy", self.filtered_data.astype(np.float32)) #half the size of float64, open with Recording.open
 
-            with open("E14_44_1ksps.csv", mode='w', newline='') as csv_file:
-                writer = csv.writer(csv_file)
-                writer.writerow(["Sample Index", "16-bit Value"])
-                for i, sample in enumerate(self.processed_audio_data):
-                    writer.writerow([i, sample])
+            with StreamingCsvWriter("E14_44_1ksps.csv") as csv_writer:
+                csv_writer.write(self.processed_audio_data)
             print("Saved: E14_44_1ksps.csv")
 
         else:
@@ -259,64 +440,113 @@ class Menu():
         self.__clear_data()
 
     def save_recording(self):
-        self.__process_raw_data()
+        # Closes anything written during capture, then hands a snapshot of the recording to the
+        # export worker so capture can re-arm while the rest is saved
+        recording = RecordingSnapshot(self.unprocessed_audio_data.view(), self.streamed_filtered_data.view(), self.current_format,
+                                      self.zero_phase_export, self.wav_sink is not None, self.csv_sink is not None,
+                                      self.segment_name, self.segment_start, self.raw_sink is not None, self.bytes_per_sample,
+                                      self.SAMPLE_RATE, self.filter_band)
+        for sink in (self.wav_sink, self.csv_sink, self.raw_sink):
+            if sink is not None:
+                sink.close()
+        self.wav_sink = None
+        self.csv_sink = None
+        self.raw_sink = None
+        self.__clear_data()
 
-        if len(self.processed_audio_data) != 0:
-            if self.current_format == self.formats[0]: #.wav
-                samples = self.processed_audio_data
-                samples = (samples - samples.min()) / (samples.max() - samples.min())
-                samples = samples * 65535
-                samples = samples.astype(np.uint16)
-                self.processed_audio_data = samples
-                self.filtered_data = self.butter_filter(self.processed_audio_data, 30, 10000, self.SAMPLE_RATE, filter_type="bandpass")
-                with wave.open("E14_44_1ksps.wav", 'wb') as wav_file:
+        if self.exporter.full():
+            print("Waiting for earlier recordings to finish saving...")
+        if self.session is not None:
+            self.exporter.submit(self.export_segment, recording, self.session)
+        else:
+            self.exporter.submit(self.export_recording, recording)
+
+    def export_segment(self, recording, session):
+        paths = self.export_recording(recording)
+        session.add_segment(recording.name, recording.start_sample, len(recording.raw) // recording.bytes_per_sample, paths)
+
+    def export_recording(self, recording):
+        # Runs on the export worker thread, only uses the snapshot it is given. Returns the files written.
+        # Streamed exports never read the recording back, so a spooled recording stays on disk.
+        wav_path = recording.name + ".wav"
+        png_path = recording.name + ".png"
+        npy_path = "filtered_signal16bit.npy" if recording.name == "E14_44_1ksps" else recording.name + "_filtered16bit.npy"
+        csv_path = recording.name + ".csv"
+        paths = []
+
+        if len(recording.raw) >= recording.bytes_per_sample:
+            if recording.format == self.formats[0] and recording.streamed_wav: #.wav, already written during capture
+                paths.append(wav_path)
+                print(f"Saved as: {wav_path}")
+
+            elif recording.format == self.formats[0]: #.wav
+                low, high = self.__sample_range(recording)
+                scale = 65535 / (high - low)
+                with wave.open(wav_path, 'wb') as wav_file:
                     wav_file.setnchannels(1)       # Mono audio
                     wav_file.setsampwidth(2)       # 16-bit depth = 2 bytes
-                    wav_file.setframerate(self.SAMPLE_RATE)
-                    wav_file.writeframes(self.filtered_data.astype(np.uint16).tobytes())
-                print("Saved as: E14_44_1ksps.wav")
-
-            elif self.current_format == self.formats[1]: #.png
-                samples = self.processed_audio_data
-                samples = (samples - samples.min()) / (samples.max() - samples.min())
-                samples = samples * 65535
-                samples = samples.astype(np.uint16)
-                self.processed_audio_data = samples
-                self.filtered_data = self.butter_filter(self.processed_audio_data, 30, 10000, self.SAMPLE_RATE, filter_type="bandpass")
-                time_axis = np.arange(len(self.filtered_data)) / self.SAMPLE_RATE
-                plt.figure(figsize=(12, 4))
-                plt.plot(time_axis, self.filtered_data, color='blue')
-                plt.title("Filtered ADC Waveform (16-bit Depth)")
-                plt.xlabel("Time (s)")
-                plt.ylabel("Amplitude (16-bit)")
-                plt.grid(True)
-                plt.tight_layout()
-                plt.savefig("E14_44_1ksps.png")
-                plt.close()
-                print("Saved: E14_44_1ksps.png")
-
-                # Save raw signal as .npy for later filtering
-                np.save("filtered_signal16bit.npy", self.filtered_data)
-
-            elif self.current_format == self.formats[2]: #.csv
-                with open("E14_44_1ksps.csv", mode='w', newline='') as csv_file:
-                    writer = csv.writer(csv_file)
-                    writer.writerow(["Sample Index", "16-bit Value"])
-                    for i, sample in enumerate(self.processed_audio_data):
-                        writer.writerow([i, sample])
-                print("Saved: E14_44_1ksps.csv")
+                    wav_file.setframerate(recording.sample_rate)
+                    for filtered_data in self.__filtered_chunks(recording, low, scale):
+                        wav_file.writeframes(filtered_data.astype(np.uint16).tobytes())
+                paths.append(wav_path)
+                print(f"Saved as: {wav_path}")
+
+            elif recording.format == self.formats[1]: #.png
+                low, high = self.__sample_range(recording)
+                scale = 65535 / (high - low)
+                # the envelope and the .npy (raw signal for later filtering) are both filled a chunk at a time
+                envelope = WaveformEnvelope() #min/max per pixel column
+                with open(npy_path, "wb") as npy_file: #float32 is half the size of float64, open with Recording.open
+                    np.lib.format.write_array_header_1_0(npy_file, {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                                                                    "fortran_order": False, "shape": (len(recording.raw) // recording.bytes_per_sample,)})
+                    for filtered_data in self.__filtered_chunks(recording, low, scale):
+                        envelope.update(filtered_data)
+                        npy_file.write(filtered_data.astype(np.float32).tobytes())
+                save_waveform(png_path, envelope, recording.sample_rate)
+                print(f"Saved: {png_path}")
+                paths += [png_path, npy_path]
+
+            elif recording.format == self.formats[2]: #.csv
+                if not recording.streamed_csv:
+                    with StreamingCsvWriter(csv_path) as csv_writer:
+                        for samples in self.__sample_chunks(recording):
+                            csv_writer.write(samples)
+                paths.append(csv_path)
+                print(f"Saved: {csv_path}")
 
         else:
             print("no data :(")
-        
-        self.__clear_data()
+
+        if recording.streamed_raw:
+            paths.append(recording.name + ".e14raw")
+        return paths
+
+    def __new_buffers(self):
+        # Raw bytes and samples filtered during capture
+        if self.spool_recordings:
+            return SpoolBuffer(folder=self.spool_folder), SpoolBuffer(dtype=np.float32, folder=self.spool_folder)
+        return CaptureBuffer(), CaptureBuffer(dtype=np.float32)
 
     def __clear_data(self):
-        self.unprocessed_audio_data = []
+        self.unprocessed_audio_data, self.streamed_filtered_data = self.__new_buffers() #release the old allocation or spool
+        self.sample_decoder.reset()
+        self.stream_filter.reset()
+        if self.wav_sink is not None:
+            self.wav_sink.close()
+            self.wav_sink = None
+        if self.csv_sink is not None:
+            self.csv_sink.close()
+            self.csv_sink = None
+        if self.raw_sink is not None:
+            self.raw_sink.close()
+            self.raw_sink = None
         self.processed_audio_data = []
         self.filtered_data = []
 
 if __name__ == "__main__":
     menu1 = Menu()
     menu1.initate_stm_con()
-    menu1.default()
\ No newline at end of file
+    try:
+        menu1.default()
+    finally:
+        menu1.exporter.wait() #let queued recordings finish saving before exiting
\ No newline at end of file
@@ -0,0 +1,429 @@
+import io
+import os
+import csv
+import gzip
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+from frame_decoder import FrameDecoder
+from frame_check import FrameChecker, xor_checksum, crc8
+from acquisition import CaptureBuffer, SerialReader
+from sample_decode import decode_12bit, SampleDecoder
+from streaming_filter import StreamingFilter, butter_sos
+from exporters import StreamingCsvWriter
+from waveform import save_waveform
+import matplotlib.pyplot as plt
+import serial
+from virtual_device import VirtualSTM32
+from multi_capture import CaptureManager
+from spool import SpoolBuffer
+from capture_file import CaptureFileWriter
+from scipy.signal import butter, filtfilt, sosfilt, sosfilt_zi
+
+#Created By: Team E14
+#Host side throughput benchmarks, run with: python benchmarks.py
+
+PAYLOAD_SIZE = 512
+
+def synthetic_stream(frame_count, payload_size=PAYLOAD_SIZE, seed=0):
+    # Builds the same 0xFF 0xFF | in_range | pad | payload stream the processor sends,
+    # with 12-bit little endian samples so the payload never contains a false sync word
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(0, 4096, size=(frame_count, payload_size // 2), dtype=np.uint16)
+    frames = np.empty((frame_count, 4 + payload_size), dtype=np.uint8)
+    frames[:, 0] = 0xFF
+    frames[:, 1] = 0xFF
+    frames[:, 2] = rng.integers(0, 2, size=frame_count)
+    frames[:, 3] = 0
+    frames[:, 4:] = samples.astype("<u2").view(np.uint8).reshape(frame_count, payload_size)
+    return frames.tobytes(), frames[:, 4:].copy(), frames[:, 2].copy()
+
+class StreamPort():
+    # Stands in for serial.Serial when reading from an in memory stream
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+        self.size = len(data)
+
+    @property
+    def in_waiting(self):
+        return self.size - self.stream.tell()
+
+    def read(self, size=1):
+        return self.stream.read(size)
+
+def legacy_read_frames(ser, frame_count, payload_size=PAYLOAD_SIZE):
+    # The original byte at a time sync search from Menu.record_audio
+    data = []
+    for _ in range(frame_count):
+        while True:
+            start1 = ser.read(1)[0]
+            if start1 == 255:
+                start2 = ser.read(1)[0]
+                if start2 == 255:
+                    ser.read(2)
+                    buffer = ser.read(payload_size)
+                    data.extend(buffer)
+                    break
+    return data
+
+def bench_frame_decoder(frame_count=20000):
+    stream, payloads, in_range = synthetic_stream(frame_count)
+
+    start = time.perf_counter()
+    legacy = legacy_read_frames(StreamPort(stream), frame_count)
+    legacy_time = time.perf_counter() - start
+
+    decoder = FrameDecoder(PAYLOAD_SIZE)
+    port = StreamPort(stream + b"\xff\xff") #the next frame's sync word confirms the last frame
+    start = time.perf_counter()
+    decoded, flags = decoder.read_frames(port, frame_count)
+    decoder_time = time.perf_counter() - start
+
+    assert bytes(legacy) == payloads.tobytes()
+    assert np.array_equal(decoded, payloads) and np.array_equal(flags, in_range)
+
+    # the decoder also has to cope with arbitrary read sizes splitting frames
+    decoder = FrameDecoder(PAYLOAD_SIZE)
+    chunks = [decoder.feed(stream[i:i + 1000]) for i in range(0, len(stream), 1000)] + [decoder.feed(b"\xff\xff")]
+    assert np.array_equal(np.concatenate([c[0] for c in chunks]), payloads)
+
+    print(f"Frame decoding ({frame_count} frames)")
+    print(f"  byte loop:    {frame_count / legacy_time:12.0f} frames/s")
+    print(f"  FrameDecoder: {frame_count / decoder_time:12.0f} frames/s ({legacy_time / decoder_time:.0f}x)")
+
+def bench_capture_memory(seconds=10, sample_rate=44100):
+    payload = bytes(PAYLOAD_SIZE)
+    frame_count = seconds * sample_rate * 2 // PAYLOAD_SIZE
+
+    tracemalloc.start()
+    data = []
+    for _ in range(frame_count):
+        data.extend(payload)
+    list_peak = tracemalloc.get_traced_memory()[1]
+    del data
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    capture = CaptureBuffer(chunk_size=sample_rate * 2)
+    for _ in range(frame_count):
+        capture.append(payload)
+    buffer_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    raw = frame_count * PAYLOAD_SIZE
+    print(f"Capture memory ({seconds} s at {sample_rate} Hz, {raw / 1e6:.1f} MB raw)")
+    print(f"  list.extend:   {list_peak / 1e6:8.1f} MB peak")
+    print(f"  CaptureBuffer: {buffer_peak / 1e6:8.1f} MB peak")
+
+def resident_memory():
+    # Resident set size of this process in bytes (Linux)
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def bench_spool_memory(minutes=30, sample_rate=44100):
+    # Resident memory while a long recording is captured, held in RAM against spooled to disk
+    block = np.zeros(sample_rate * 2, dtype=np.uint8) #one second of raw bytes
+    results = {}
+    for name, make in (("CaptureBuffer", lambda: CaptureBuffer(chunk_size=sample_rate * 2 * 60)), ("SpoolBuffer", SpoolBuffer)):
+        before = resident_memory()
+        growth = 0
+        buffer = make()
+        start = time.perf_counter()
+        for second in range(minutes * 60):
+            buffer.append(block)
+            if second % 60 == 0:
+                growth = max(growth, resident_memory() - before)
+        growth = max(growth, resident_memory() - before)
+        results[name] = (growth, time.perf_counter() - start, len(buffer))
+        del buffer
+
+    print(f"Recording memory ({minutes} min at {sample_rate} Hz, {results['SpoolBuffer'][2] / 1e6:.0f} MB raw)")
+    for name, (growth, elapsed, _) in results.items():
+        print(f"  {name + ':':15s} {growth / 1e6:8.1f} MB resident growth, {elapsed * 1000:6.0f} ms to append")
+
+def legacy_decode_12bit(data):
+    # The original per sample loop from Menu.__process_raw_data
+    data = np.array(data, dtype=np.uint8)
+    samples = []
+    for i in range(0, len(data), 2):
+        lsb = int(data[i])
+        msb = int(data[i+1])
+        sample = ((msb & 0x0F) << 8) | lsb
+        samples.append(sample)
+    return np.array(samples)
+
+def bench_sample_decode(seconds=10, sample_rate=44100):
+    rng = np.random.default_rng(1)
+    raw = rng.integers(0, 256, size=seconds * sample_rate * 2, dtype=np.uint8) #upper nibble not zero filled
+
+    start = time.perf_counter()
+    legacy = legacy_decode_12bit(raw)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    samples = decode_12bit(raw)
+    decode_time = time.perf_counter() - start
+
+    assert np.array_equal(legacy, samples)
+    assert np.array_equal(decode_12bit(raw.tobytes()), samples)
+
+    # frame by frame, including frames that split a sample across the boundary
+    decoder = SampleDecoder()
+    chunks = [decoder.decode(raw[i:i + 511]) for i in range(0, len(raw), 511)]
+    assert np.array_equal(np.concatenate(chunks), samples)
+
+    print(f"12-bit sample decoding ({len(samples)} samples)")
+    print(f"  python loop:  {len(samples) / legacy_time:12.0f} samples/s")
+    print(f"  decode_12bit: {len(samples) / decode_time:12.0f} samples/s ({legacy_time / decode_time:.0f}x)")
+
+def bench_streaming_filter(seconds=60, sample_rate=44100):
+    rng = np.random.default_rng(2)
+    samples = rng.integers(0, 4096, size=seconds * sample_rate).astype(np.float64)
+    frame = PAYLOAD_SIZE // 2
+
+    # the original whole recording filtfilt that runs after capture ends
+    start = time.perf_counter()
+    b, a = butter(5, [30 / (0.5 * sample_rate), 10000 / (0.5 * sample_rate)], btype="bandpass")
+    filtfilt(b, a, samples)
+    offline_time = time.perf_counter() - start
+
+    stream_filter = StreamingFilter(30, 10000, sample_rate)
+    start = time.perf_counter()
+    chunks = [stream_filter.process(samples[i:i + frame]) for i in range(0, len(samples), frame)]
+    streaming_time = time.perf_counter() - start
+
+    sos = butter_sos(30, 10000, sample_rate)
+    whole, _ = sosfilt(sos, samples, zi=sosfilt_zi(sos) * samples[0])
+    assert np.allclose(np.concatenate(chunks), whole)
+
+    print(f"Filtering ({seconds} s recording)")
+    print(f"  filtfilt after capture: {offline_time * 1000:8.1f} ms added to save")
+    print(f"  per frame sosfilt:      {streaming_time / (len(samples) / frame) * 1e6:8.1f} us per {frame} sample frame, 0 ms added to save")
+
+def bench_csv_export(seconds=60, sample_rate=44100):
+    samples = decode_12bit(np.random.default_rng(3).integers(0, 256, size=seconds * sample_rate * 2, dtype=np.uint8))
+    folder = tempfile.mkdtemp()
+    legacy_path = os.path.join(folder, "legacy.csv")
+    export_path = os.path.join(folder, "export.csv")
+
+    # the original writerow per sample from Menu.save_recording
+    start = time.perf_counter()
+    with open(legacy_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Sample Index", "16-bit Value"])
+        for i, sample in enumerate(samples):
+            writer.writerow([i, sample])
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with StreamingCsvWriter(export_path) as csv_writer:
+        csv_writer.write(samples)
+    export_time = time.perf_counter() - start
+
+    # a frame at a time during capture, and gzip compressed
+    with StreamingCsvWriter(export_path + ".gz", compress=True) as csv_writer:
+        for i in range(0, len(samples), PAYLOAD_SIZE // 2):
+            csv_writer.write(samples[i:i + PAYLOAD_SIZE // 2])
+
+    with open(legacy_path, "rb") as legacy, open(export_path, "rb") as export:
+        expected = legacy.read()
+        assert export.read() == expected
+    with gzip.open(export_path + ".gz", "rb") as compressed:
+        assert compressed.read() == expected
+
+    print(f"CSV export ({len(samples)} rows)")
+    print(f"  csv.writer:         {len(samples) / legacy_time:12.0f} rows/s")
+    print(f"  StreamingCsvWriter: {len(samples) / export_time:12.0f} rows/s ({legacy_time / export_time:.0f}x)")
+
+def bench_waveform(seconds=60, sample_rate=44100):
+    rng = np.random.default_rng(4)
+    time_axis = np.arange(seconds * sample_rate) / sample_rate
+    signal = 20000 * np.sin(2 * np.pi * 0.5 * time_axis) * np.sin(2 * np.pi * 440 * time_axis) + rng.normal(0, 2000, len(time_axis))
+    folder = tempfile.mkdtemp()
+    legacy_path = os.path.join(folder, "legacy.png")
+    envelope_path = os.path.join(folder, "envelope.png")
+
+    # the original plot of every sample from Menu.save_recording
+    start = time.perf_counter()
+    plt.figure(figsize=(12, 4))
+    plt.plot(time_axis, signal, color='blue')
+    plt.title("Filtered ADC Waveform (16-bit Depth)")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Amplitude (16-bit)")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(legacy_path)
+    plt.close()
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    save_waveform(envelope_path, signal, sample_rate)
+    envelope_time = time.perf_counter() - start
+
+    legacy_image = plt.imread(legacy_path)
+    envelope_image = plt.imread(envelope_path)
+    differing = np.mean(np.any(np.abs(legacy_image - envelope_image) > 0.25, axis=2))
+
+    print(f"Waveform render ({len(signal)} samples)")
+    print(f"  plot every sample: {legacy_time * 1000:8.0f} ms")
+    print(f"  min/max envelope:  {envelope_time * 1000:8.0f} ms ({legacy_time / envelope_time:.0f}x), {differing * 100:.2f}% of pixels differ")
+
+def bench_virtual_device(frame_count=5000):
+    # End to end over a pseudo-terminal, so every read is a real syscall like on the STM32 port
+    results = {}
+    for name in ("byte loop", "FrameDecoder"):
+        with VirtualSTM32(realtime=False, seed=5) as device:
+            ser = serial.Serial(device.port, 921600, timeout=1)
+            start = time.perf_counter()
+            if name == "byte loop":
+                data = legacy_read_frames(ser, frame_count)
+                frames = len(data) // PAYLOAD_SIZE
+            else:
+                frames = len(FrameDecoder(PAYLOAD_SIZE).read_frames(ser, frame_count)[0])
+            results[name] = frames / (time.perf_counter() - start)
+            ser.close()
+        assert frames >= frame_count
+
+    print(f"Virtual STM32 over a pty ({frame_count} frames)")
+    print(f"  byte loop:    {results['byte loop']:12.0f} frames/s")
+    print(f"  FrameDecoder: {results['FrameDecoder']:12.0f} frames/s, the real link carries {921600 / 10 / (PAYLOAD_SIZE + 4):.0f} frames/s")
+
+def legacy_checksum(payload):
+    # One frame at a time, XOR each character like temp/ECE2071/checksum.py
+    checksum = 0
+    for byte in payload:
+        checksum ^= byte
+    return checksum
+
+def bench_frame_check(frame_count=20000):
+    # Check bytes verified in bulk, against a loop over every byte, and the decoder with and without a checker
+    results = {}
+    for method, checksums in (("xor", xor_checksum), ("crc8", crc8)):
+        device = VirtualSTM32(seed=6, checksum=method, corrupt_rate=0.01)
+        stream = device.frames(frame_count)
+        payloads = np.frombuffer(stream, dtype=np.uint8).reshape(frame_count, -1)[:, 4:]
+        stream += b"\xff\xff" #the next frame's sync word confirms the last frame
+        if method == "xor":
+            start = time.perf_counter()
+            [legacy_checksum(payload) for payload in payloads[:1000].tolist()]
+            results["byte loop"] = 1000 / (time.perf_counter() - start)
+        start = time.perf_counter()
+        checksums(payloads)
+        results[method] = frame_count / (time.perf_counter() - start)
+
+        decoder = FrameDecoder(PAYLOAD_SIZE, checker=FrameChecker(method, "conceal"))
+        start = time.perf_counter()
+        decoded = len(decoder.read_frames(StreamPort(stream), frame_count)[0])
+        results[method + " decoder"] = decoded / (time.perf_counter() - start)
+        assert decoded == frame_count
+        results[method + " corrupt"] = decoder.checker.frames_corrupt
+    start = time.perf_counter()
+    FrameDecoder(PAYLOAD_SIZE).read_frames(StreamPort(stream), frame_count)
+    results["unchecked decoder"] = frame_count / (time.perf_counter() - start)
+
+    print(f"Frame checks ({frame_count} frames of {PAYLOAD_SIZE} bytes, 1% corrupted)")
+    print(f"  xor, byte loop:       {results['byte loop']:12.0f} frames/s")
+    print(f"  xor, 2D reduce:       {results['xor']:12.0f} frames/s")
+    print(f"  crc8, 2D reduce:      {results['crc8']:12.0f} frames/s")
+    print(f"  decoder, unchecked:   {results['unchecked decoder']:12.0f} frames/s")
+    print(f"  decoder + xor:        {results['xor decoder']:12.0f} frames/s, {results['xor corrupt']} corrupt frames found")
+    print(f"  decoder + crc8:       {results['crc8 decoder']:12.0f} frames/s, {results['crc8 corrupt']} corrupt frames found")
+
+def bench_journal(seconds=60, sample_rate=44100, frames_per_write=8):
+    # Writing the .e14raw journal with different fsync cadences, as a share of the real time budget
+    frame_count = seconds * sample_rate * 2 // PAYLOAD_SIZE
+    payloads = np.zeros((frames_per_write, PAYLOAD_SIZE), dtype=np.uint8)
+    folder = tempfile.mkdtemp()
+    print(f"Capture journal ({seconds} s of frames, {frames_per_write} frames per write)")
+    # written faster than real time, so only the frame count cadence is exercised
+    for name, sync_frames, sync_interval in (("no fsync", None, None), ("fsync every write", 1, None), ("fsync every 256 frames", 256, None)):
+        path = os.path.join(folder, "journal.e14raw")
+        start = time.perf_counter()
+        with CaptureFileWriter(path, sample_rate, PAYLOAD_SIZE, start_time=0, sync_frames=sync_frames, sync_interval=sync_interval) as writer:
+            for frame in range(0, frame_count, frames_per_write):
+                writer.write(payloads, 1, frame / frame_count * seconds)
+        elapsed = time.perf_counter() - start
+        os.remove(path)
+        print(f"  {name + ':':24s} {elapsed * 1000:8.0f} ms, {writer.syncs:5d} syncs, {elapsed / seconds * 100:6.2f}% of real time")
+
+def spin_on_in_waiting(ser, seconds, arrivals):
+    # WORKING_MVP/process_python_v5_Timing_Dependant.py
+    start = time.time()
+    while time.time() - start < seconds:
+        to_read = ser.in_waiting
+        if to_read:
+            arrivals.append((time.perf_counter(), len(ser.read(to_read))))
+
+def read_byte_at_a_time(ser, seconds, arrivals):
+    # temp/ECE2071/prac3task3.py, with timeout=0.001
+    start = time.time()
+    while time.time() - start < seconds:
+        byte = ser.read(1)
+        if byte:
+            arrivals.append((time.perf_counter(), 1))
+
+def read_with_serial_reader(ser, seconds, arrivals):
+    reader = SerialReader(ser)
+    reader.start()
+    start = time.time()
+    while time.time() - start < seconds:
+        data = reader.buffer.read(max(reader.buffer.in_waiting, 1))
+        arrivals.append((time.perf_counter(), len(data)))
+    reader.stop()
+    return reader.wakeups
+
+def bench_acquisition_cpu(seconds=3):
+    # CPU used to receive the 5 kHz legacy stream, less what the virtual board itself uses.
+    # Longest gap is the longest time between bytes reaching the program, how late a sample can be.
+    with VirtualSTM32("legacy", seed=8) as device:
+        start, cpu = time.perf_counter(), time.process_time()
+        time.sleep(seconds)
+        idle = (time.process_time() - cpu) / (time.perf_counter() - start)
+    print(f"Legacy 5 kHz acquisition ({seconds} s, CPU of one core)")
+    for name, method, timeout in (("spin on in_waiting", spin_on_in_waiting, 0.1), ("read(1), timeout 1 ms", read_byte_at_a_time, 0.001),
+                                  ("SerialReader", read_with_serial_reader, None)):
+        with VirtualSTM32("legacy", seed=8) as device:
+            ser = serial.Serial(device.port, 115200, timeout=timeout)
+            arrivals = []
+            start, cpu = time.perf_counter(), time.process_time()
+            wakeups = method(ser, seconds, arrivals)
+            elapsed = time.perf_counter() - start
+            usage = (time.process_time() - cpu) / elapsed - idle
+            ser.close()
+        times = np.array([when for when, count in arrivals if count != 0])
+        received = sum(count for when, count in arrivals)
+        reads = wakeups if wakeups is not None else len(times)
+        print(f"  {name + ':':24s} {max(usage, 0) * 100:6.1f}% CPU, {reads / elapsed:6.0f} reads/s, "
+              f"longest gap {np.diff(times).max() * 1000:5.1f} ms, {received / elapsed:6.0f} bytes/s")
+
+def bench_multi_device(device_counts=(1, 2, 4), seconds=3):
+    # Several real time virtual boards recorded at once, each should keep up with its full frame rate
+    folder = tempfile.mkdtemp()
+    print(f"Multi-device capture ({seconds} s per run)")
+    for count in device_counts:
+        boards = [VirtualSTM32(seed=i) for i in range(count)]
+        ports = [board.start() for board in boards]
+        manager = CaptureManager(ports, os.path.join(folder, str(count)))
+        start = time.perf_counter()
+        manager.record(seconds)
+        elapsed = time.perf_counter() - start
+        for board in boards:
+            board.stop()
+        frames = [device.frames for device in manager.devices]
+        sent = sum(board.frames_sent for board in boards)
+        print(f"  {count} device(s): {sum(frames) / elapsed:8.0f} frames/s aggregate, {sum(frames)}/{sent} frames sent were captured")
+
+if __name__ == "__main__":
+    bench_frame_decoder()
+    bench_capture_memory()
+    bench_spool_memory()
+    bench_sample_decode()
+    bench_streaming_filter()
+    bench_csv_export()
+    bench_waveform()
+    bench_virtual_device()
+    bench_acquisition_cpu()
+    bench_frame_check()
+    bench_journal()
+    bench_multi_device()
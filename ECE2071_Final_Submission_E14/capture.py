@@ -0,0 +1,95 @@
+import time
+import numpy as np
+from sample_decode import as_array
+
+#Created By: Team E14
+#Capture control: how much to record and when to stop
+
+class CaptureController():
+    # Records an exact number of samples rather than a guessed number of frames. Each read asks
+    # for only the frames still needed and the last frame is cut on the exact sample boundary.
+    def __init__(self, decoder, sample_rate, bytes_per_sample=2):
+        self.decoder = decoder
+        self.sample_rate = sample_rate
+        self.bytes_per_sample = bytes_per_sample
+
+        self.samples_captured = 0
+        self.elapsed = 0
+        self.achieved_rate = 0
+
+    def record(self, source, seconds, on_data):
+        # Reads from source until seconds*sample_rate samples have been passed to on_data, along with
+        # the in_range, arrival, resync and corrupt details of the frames they came from. on_data gets
+        # whole frames as a 2D array, and the last frame once it is cut on the sample boundary as a 1D one.
+        target_bytes = int(round(seconds * self.sample_rate)) * self.bytes_per_sample
+        captured = 0
+        start = time.perf_counter()
+        while captured < target_bytes:
+            payload_size = self.decoder.payload_size #can change if the decoder measures a different frame size
+            # at most one read's worth at a time, so every frame reaches on_data (and the journal) soon after it arrives
+            frames_needed = min(-(-(target_bytes - captured) // payload_size), self.decoder.max_read_frames)
+            payloads, in_range = self.decoder.read_frames(source, frames_needed, exact=True)
+            if len(payloads) == 0:
+                break
+            whole, tail = divmod(min(payloads.size, target_bytes - captured), payloads.shape[1])
+            details = (in_range, self.decoder.last_arrival, self.decoder.last_resync, self.decoder.last_corrupt)
+            # whole frames as (frames x payload_size) and the frame cut short on its own, so the journal
+            # puts each frame's in_range and flags on the records that hold its bytes
+            if whole != 0:
+                on_data(payloads[:whole], *(values[:whole] for values in details))
+            if tail != 0:
+                on_data(payloads[whole, :tail], *(values[whole:whole + 1] for values in details))
+            captured += whole * payloads.shape[1] + tail
+
+        self.elapsed = time.perf_counter() - start
+        self.samples_captured = captured // self.bytes_per_sample
+        self.achieved_rate = self.samples_captured / self.elapsed if self.elapsed > 0 else 0
+        return self.samples_captured
+
+class PreRollBuffer():
+    # The last few seconds of frames before a trigger, kept in one preallocated ring so memory stays
+    # the same however long distance mode sits armed. Stores raw payload bytes (2 per sample), rounded
+    # up to whole frames, with each frame's in_range, arrival time, resync and corrupt flags alongside.
+    def __init__(self, seconds, sample_rate, frame_size=512, bytes_per_sample=2):
+        self.frame_size = frame_size
+        self.frame_capacity = -(-int(seconds * sample_rate) * bytes_per_sample // frame_size)
+        self.capacity = self.frame_capacity * frame_size
+        self.buffer = np.zeros(self.capacity, dtype=np.uint8)
+        self.in_range = np.zeros(self.frame_capacity, dtype=np.uint8)
+        self.arrival = np.zeros(self.frame_capacity)
+        self.resync = np.zeros(self.frame_capacity, dtype=bool)
+        self.corrupt = np.zeros(self.frame_capacity, dtype=bool)
+        self.frame_count = 0
+
+    def __len__(self):
+        return min(self.frame_count, self.frame_capacity) * self.frame_size
+
+    def push(self, payload, in_range=0, arrival=0.0, resync=False, corrupt=False):
+        # payload is one frame
+        if self.frame_capacity == 0:
+            return
+        slot = self.frame_count % self.frame_capacity
+        self.buffer[slot * self.frame_size:(slot + 1) * self.frame_size] = as_array(payload).reshape(-1)
+        self.in_range[slot] = in_range
+        self.arrival[slot] = arrival
+        self.resync[slot] = resync
+        self.corrupt[slot] = corrupt
+        self.frame_count += 1
+
+    def __order(self):
+        if self.frame_count <= self.frame_capacity:
+            return [slice(0, self.frame_count)]
+        slot = self.frame_count % self.frame_capacity
+        return [slice(slot, self.frame_capacity), slice(0, slot)]
+
+    def contents(self):
+        # Oldest to newest as (at most two) views into the ring, nothing is copied
+        return [self.buffer[part.start * self.frame_size:part.stop * self.frame_size] for part in self.__order()]
+
+    def metadata(self):
+        # (in_range, arrival, resync, corrupt) for the frames in contents(), oldest first
+        order = self.__order()
+        return tuple(np.concatenate([values[part] for part in order]) for values in (self.in_range, self.arrival, self.resync, self.corrupt))
+
+    def clear(self):
+        self.frame_count = 0
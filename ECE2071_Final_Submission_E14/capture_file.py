@@ -0,0 +1,313 @@
+import os
+import time
+import struct
+import numpy as np
+from sample_decode import decode_samples, as_array
+
+#Created By: Team E14
+#Raw capture files (.e14raw): every frame payload as received, so a recording can be reprocessed later
+#
+#  header   32 bytes   magic, version, sample rate, payload size, capture start (unix time), bytes per sample
+#  records  appended   one fixed size record per frame (per payload_size bytes if the board's size changes):
+#                       arrival time, in_range, flags, length, payload. Only the last record can be short.
+#  footer   on close   frame count, arrival time index and resync frame numbers
+#  trailer  16 bytes   footer offset and end marker
+#
+# Records are fixed size so frame n is always at HEADER_SIZE + n*record_size. A file without a
+# trailer (capture was killed) is still readable, the index is rebuilt from the records, which
+# makes the file a journal of the capture: see recover.py.
+
+MAGIC = b"E14RAW\x00\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIIdB3x")
+FOOTER = struct.Struct("<8sQdQQ")
+TRAILER = struct.Struct("<Q8s")
+FOOTER_MAGIC = b"E14INDEX"
+TRAILER_MAGIC = b"E14END\x00\x00"
+
+FLAG_RESYNC = 0x01 #bytes were skipped to find this frame's sync word
+FLAG_CORRUPT = 0x02 #payload did not match the frame's check byte
+
+def record_dtype(payload_size):
+    return np.dtype([("arrival", "<f8"), ("in_range", "u1"), ("flags", "u1"), ("length", "<u2"), ("payload", "u1", (payload_size,))])
+
+def _write_footer(capture_file, frame_count, index_interval, time_index, resyncs):
+    footer_offset = capture_file.tell()
+    capture_file.write(FOOTER.pack(FOOTER_MAGIC, frame_count, index_interval, len(time_index), len(resyncs)))
+    capture_file.write(np.asarray(time_index, dtype="<u8").tobytes())
+    capture_file.write(np.asarray(resyncs, dtype="<u8").tobytes())
+    capture_file.write(TRAILER.pack(footer_offset, TRAILER_MAGIC))
+
+def capture_interrupted(path):
+    # True for a capture file that was never closed (a crash, or a pulled cable before the recording was saved)
+    try:
+        return not CaptureFile(path).complete
+    except (ValueError, struct.error):
+        return False #not a capture file, or cut off inside the header
+
+class CaptureFileWriter():
+    # Appends frames as they are captured. arrival is host time.time() for each frame, in_range,
+    # arrival, resync and corrupt can be one value for every frame written or one per frame.
+    # Frames are forced to disk (fsync) once sync_frames frames or sync_interval seconds have been
+    # written since the last sync, so a crash loses at most that much and the cost is paid once per batch.
+    def __init__(self, path, sample_rate, payload_size=512, index_interval=1.0, start_time=None, bytes_per_sample=2,
+                 sync_frames=None, sync_interval=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.payload_size = payload_size
+        self.bytes_per_sample = bytes_per_sample
+        self.index_interval = index_interval #seconds of arrival time per index entry
+        self.start_time = time.time() if start_time is None else start_time
+        self.__start_from_first_frame = start_time is None #pre-roll frames can arrive before the file is opened
+        self.dtype = record_dtype(payload_size)
+
+        self.frame_count = 0
+        self.time_index = [] #first frame that arrived in each index interval
+        self.resyncs = []
+
+        self.sync_frames = sync_frames
+        self.sync_interval = sync_interval
+        self.syncs = 0
+        self.sync_time = 0 #seconds spent in fsync
+        self.__unsynced = 0 #frames written since the last sync
+        self.__last_sync = time.monotonic()
+        self.__pending = np.empty(0, dtype=np.uint8) #bytes short of a whole record, written by the next write or close()
+        self.__pending_details = None #in_range, arrival, resync and corrupt for the pending bytes
+
+        if os.path.exists(path) and capture_interrupted(path):
+            raise FileExistsError(f"{path} is an interrupted capture, rebuild it with recover.py before recording over it")
+        self.file = open(path, "wb")
+        self.__write_header()
+
+    def __write_header(self):
+        self.file.write(HEADER.pack(MAGIC, VERSION, HEADER.size, self.sample_rate, self.payload_size, self.start_time, self.bytes_per_sample))
+
+    def write(self, payloads, in_range, arrival, resync=False, corrupt=False):
+        # payloads is (frames x payload_size), frames of another size, or a flat run of bytes split evenly
+        # between the frames its per frame details are given for (so pass a short frame on its own). Bytes that do not fill a whole record
+        # (a short frame, or frames of a new payload size after the board changed it) are held back and
+        # carried into the next write, so records stay packed and only the last one in the file is short.
+        # A record takes in_range and arrival from the frame it starts in, is a resync if a resync frame
+        # starts in it, and is corrupt if it holds any bytes of a corrupt frame.
+        payloads = as_array(payloads).astype(np.uint8, copy=False)
+        details = [np.asarray(values) for values in (in_range, arrival, resync, corrupt)]
+        frames = len(payloads) if payloads.ndim == 2 else max(values.size for values in details)
+        data = payloads.reshape(-1)
+        if frames == 0 or len(data) == 0:
+            return
+        if payloads.ndim == 2 and payloads.shape[1] == self.payload_size and len(self.__pending) == 0: #whole records, as usual
+            in_range, arrival, resync, corrupt = details
+            self.__write_records(payloads, in_range, arrival, np.where(resync, FLAG_RESYNC, 0) | np.where(corrupt, FLAG_CORRUPT, 0))
+            return
+        in_range, arrival, resync, corrupt = (np.broadcast_to(values.reshape(-1), (frames,)) for values in details)
+        resync, corrupt = resync.astype(bool), corrupt.astype(bool)
+        starts = np.arange(frames) * len(data) // frames #byte offset of each frame in data
+
+        if len(self.__pending) != 0: #the held back bytes go first, as one more frame
+            pending = self.__pending
+            data = np.concatenate((pending, data))
+            starts = np.concatenate(([0], starts + len(pending)))
+            in_range, arrival, resync, corrupt = (np.concatenate(([held], values)) for held, values in zip(self.__pending_details, (in_range, arrival, resync, corrupt)))
+
+        count = len(data) // self.payload_size
+        record_starts = np.arange(count + 1) * self.payload_size #the last one is where the held back bytes start
+        first = np.searchsorted(starts, record_starts, "right") - 1 #frame each record starts in
+        first_starting = np.searchsorted(starts, record_starts, "left") #first frame that starts in each record
+        end = np.searchsorted(starts, record_starts + self.payload_size, "left") #first frame after each record
+        resync_count = np.concatenate(([0], np.cumsum(resync)))
+        corrupt_count = np.concatenate(([0], np.cumsum(corrupt)))
+        resync = resync_count[end] > resync_count[first_starting]
+        corrupt = corrupt_count[end] > corrupt_count[first]
+
+        self.__pending = data[count * self.payload_size:].copy()
+        self.__pending_details = (in_range[first[-1]], arrival[first[-1]], resync[-1], corrupt[-1])
+        if count != 0:
+            flags = np.where(resync[:-1], FLAG_RESYNC, 0) | np.where(corrupt[:-1], FLAG_CORRUPT, 0)
+            self.__write_records(data[:count * self.payload_size].reshape(count, self.payload_size),
+                                 in_range[first[:-1]], arrival[first[:-1]], flags)
+
+    def __write_records(self, payloads, in_range, arrival, flags, last_length=None):
+        if self.__start_from_first_frame:
+            self.start_time = min(self.start_time, float(np.min(arrival)))
+            self.file.seek(0)
+            self.__write_header()
+            self.file.seek(0, os.SEEK_END)
+            self.__start_from_first_frame = False
+
+        count = len(payloads)
+        records = np.zeros(count, dtype=self.dtype)
+        records["payload"] = payloads
+        records["length"] = self.payload_size
+        if last_length is not None:
+            records["length"][-1] = last_length
+        records["arrival"] = np.asarray(arrival, dtype=np.float64) - self.start_time
+        records["in_range"] = in_range
+        records["flags"] = flags
+        self.file.write(records.tobytes())
+
+        # index entries for every interval boundary these frames crossed
+        intervals = np.floor(records["arrival"] / self.index_interval).astype(np.int64)
+        new = np.arange(len(self.time_index), max(intervals.max() + 1, len(self.time_index)))
+        self.time_index.extend((self.frame_count + np.searchsorted(intervals, new)).tolist())
+        self.resyncs.extend((self.frame_count + np.flatnonzero(records["flags"] & FLAG_RESYNC)).tolist())
+        self.frame_count += count
+
+        self.__unsynced += count
+        if self.sync_frames is not None and self.__unsynced >= self.sync_frames:
+            self.sync()
+        elif self.sync_interval is not None and time.monotonic() - self.__last_sync >= self.sync_interval:
+            self.sync()
+
+    def flush(self):
+        self.file.flush()
+
+    def sync(self):
+        # Everything written so far is on the disk, not just in the OS cache, once this returns
+        start = time.monotonic()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.__last_sync = time.monotonic()
+        self.sync_time += self.__last_sync - start
+        self.syncs += 1
+        self.__unsynced = 0
+
+    def close(self):
+        if not self.file.closed:
+            if len(self.__pending) != 0: #the short last record
+                padded = np.zeros((1, self.payload_size), dtype=np.uint8)
+                padded[0, :len(self.__pending)] = self.__pending
+                in_range, arrival, resync, corrupt = self.__pending_details
+                flags = (FLAG_RESYNC if resync else 0) | (FLAG_CORRUPT if corrupt else 0)
+                self.__write_records(padded, [in_range], [arrival], [flags], last_length=len(self.__pending))
+                self.__pending = self.__pending[:0]
+            _write_footer(self.file, self.frame_count, self.index_interval, self.time_index, self.resyncs)
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class CaptureFile():
+    # Read side of a .e14raw file. The records are memory mapped, so opening is instant whatever
+    # the length and only the frames that are used get read from disk.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as capture_file:
+            magic, version, header_size, self.sample_rate, self.payload_size, self.start_time, self.bytes_per_sample = HEADER.unpack(capture_file.read(HEADER.size))
+            self.bytes_per_sample = self.bytes_per_sample or 2 #files from before it was stored are all 12-bit
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a raw capture file")
+            if version != VERSION:
+                raise ValueError(f"{path} is capture file version {version}, only version {VERSION} is supported")
+            self.dtype = record_dtype(self.payload_size)
+            footer = self.__read_footer(capture_file)
+        self.header_size = header_size
+        self.complete = footer is not None #False if the capture never closed the file
+
+        if footer is None: #never closed, use every whole record that reached the disk
+            self.frame_count = (os.path.getsize(path) - header_size) // self.dtype.itemsize
+        else:
+            self.frame_count, self.index_interval, time_index, resyncs = footer
+        self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=header_size, shape=(self.frame_count,)) if self.frame_count else np.zeros(0, dtype=self.dtype)
+        if footer is None:
+            self.index_interval = 1.0
+            intervals = np.floor(self.records["arrival"] / self.index_interval).astype(np.int64)
+            time_index = np.searchsorted(intervals, np.arange(intervals.max() + 1 if self.frame_count else 0))
+            resyncs = np.flatnonzero(self.records["flags"] & FLAG_RESYNC)
+        self.time_index = time_index
+        self.resyncs = resyncs
+
+    @property
+    def corrupt(self):
+        # Frames that failed their check byte and were kept as received
+        return np.flatnonzero(self.records["flags"] & FLAG_CORRUPT)
+
+    def finish(self):
+        # Closes off a file left by an interrupted capture: drops any partly written record and adds
+        # the footer, so it opens without rebuilding the index next time
+        if self.complete:
+            return
+        with open(self.path, "r+b") as capture_file:
+            capture_file.truncate(self.header_size + self.frame_count * self.dtype.itemsize)
+            capture_file.seek(0, os.SEEK_END)
+            _write_footer(capture_file, self.frame_count, self.index_interval, self.time_index, self.resyncs)
+        self.complete = True
+
+    def __read_footer(self, capture_file):
+        capture_file.seek(0, os.SEEK_END)
+        if capture_file.tell() < HEADER.size + TRAILER.size:
+            return None
+        capture_file.seek(-TRAILER.size, os.SEEK_END)
+        footer_offset, magic = TRAILER.unpack(capture_file.read(TRAILER.size))
+        if magic != TRAILER_MAGIC:
+            return None
+        capture_file.seek(footer_offset)
+        magic, frame_count, index_interval, index_count, resync_count = FOOTER.unpack(capture_file.read(FOOTER.size))
+        if magic != FOOTER_MAGIC:
+            return None
+        time_index = np.frombuffer(capture_file.read(8 * index_count), dtype="<u8")
+        resyncs = np.frombuffer(capture_file.read(8 * resync_count), dtype="<u8")
+        return frame_count, index_interval, time_index, resyncs
+
+    def __len__(self):
+        return self.frame_count
+
+    @property
+    def payloads(self):
+        return self.records["payload"]
+
+    @property
+    def in_range(self):
+        return self.records["in_range"]
+
+    @property
+    def arrival(self):
+        # Seconds after the capture started that each frame was read by the host
+        return self.records["arrival"]
+
+    @property
+    def samples_per_frame(self):
+        return self.payload_size // self.bytes_per_sample
+
+    @property
+    def sample_count(self):
+        # Only the last frame can be short
+        if self.frame_count == 0:
+            return 0
+        return (self.frame_count - 1) * self.samples_per_frame + int(self.records["length"][-1]) // self.bytes_per_sample
+
+    @property
+    def duration(self):
+        return self.sample_count / self.sample_rate
+
+    def frame_at(self, seconds):
+        # Frame holding the sample at this offset into the recording
+        return min(int(seconds * self.sample_rate) // self.samples_per_frame, self.frame_count)
+
+    def frame_at_arrival(self, seconds):
+        # First frame the host received at or after this many seconds into the capture, via the index
+        interval = int(seconds // self.index_interval)
+        if interval >= len(self.time_index):
+            return self.frame_count
+        frame = int(self.time_index[interval])
+        end = int(self.time_index[interval + 1]) if interval + 1 < len(self.time_index) else self.frame_count
+        return frame + int(np.searchsorted(self.records["arrival"][frame:end], seconds))
+
+    def raw(self, start=0, stop=None):
+        # Payload bytes for a range of frames, without the padding of a short last frame
+        records = self.records[start:stop]
+        data = records["payload"].reshape(-1)
+        if len(records) != 0 and records["length"][-1] != self.payload_size:
+            data = data[:len(data) - self.payload_size + int(records["length"][-1])] #int, a uint16 would overflow
+        return data
+
+    def samples(self, start=0, stop=None):
+        # 12-bit (or legacy 8-bit) samples for a range of frames
+        return decode_samples(self.raw(start, stop), self.bytes_per_sample)
+
+    def chunks(self, frames_per_chunk=1024):
+        # Yields the samples a block of frames at a time, for reprocessing captures larger than memory
+        for start in range(0, self.frame_count, frames_per_chunk):
+            yield self.samples(start, start + frames_per_chunk)
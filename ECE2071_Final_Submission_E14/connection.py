@@ -0,0 +1,83 @@
+import time
+import serial
+import serial.tools.list_ports
+
+#Created By: Team E14
+#Finds the board's serial port and reopens it when the USB cable is pulled and plugged back in
+
+class ConnectionSupervisor():
+    # Opens the port and remembers what it was (device path, USB VID/PID and serial number).
+    # After a disconnect reconnect() tries the remembered path first, which is fastest when the board
+    # comes back on the same port, then any port with the same VID/PID (and serial number, so one of
+    # several boards is not mistaken for another), then any port whose description contains match.
+    def __init__(self, baud_rate, match="STM", timeout=None, retry_interval=0.05):
+        self.baud_rate = baud_rate
+        self.match = match #None to only reconnect to the same board
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+
+        self.port = None #last port that opened
+        self.vid = None
+        self.pid = None
+        self.serial_number = None
+        self.ser = None
+
+        self.disconnects = 0
+        self.downtimes = [] #seconds from each disconnect until the port was open again
+        self.connected_at = None
+
+    def find_ports(self):
+        # Candidate ports, most likely first
+        ports = []
+        for device in serial.tools.list_ports.comports():
+            same_board = self.vid is not None and (device.vid, device.pid) == (self.vid, self.pid) and \
+                (self.serial_number is None or device.serial_number == self.serial_number)
+            if same_board:
+                ports.insert(0, device.device)
+            elif self.match is not None and self.match in str(device):
+                ports.append(device.device)
+        return ports
+
+    def open(self, port=None):
+        # Opens port, or the first port find_ports() gives
+        port = port or self.port or next(iter(self.find_ports()), None)
+        if port is None:
+            raise serial.SerialException(f"no serial port matching {self.match!r} found")
+        self.ser = serial.Serial(port, self.baud_rate, timeout=self.timeout)
+        self.__remember(port)
+        return self.ser
+
+    def __remember(self, port):
+        self.port = port
+        self.connected_at = time.monotonic()
+        for device in serial.tools.list_ports.comports():
+            if device.device == port and device.vid is not None:
+                self.vid, self.pid, self.serial_number = device.vid, device.pid, device.serial_number
+
+    def reconnect(self, keep_trying=lambda: True, give_up_after=None):
+        # Closes the failed port and keeps trying until one opens, keep_trying() returns False or
+        # give_up_after seconds pass. Returns the new serial.Serial, or None if it gave up.
+        self.disconnects += 1
+        start = time.monotonic()
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+        self.ser = None
+        print(f"Lost connection to {self.port}, reconnecting...")
+        while keep_trying() and (give_up_after is None or time.monotonic() - start < give_up_after):
+            for port in dict.fromkeys([self.port] + self.find_ports()): #the cached port first, without repeats
+                try:
+                    self.open(port)
+                except (serial.SerialException, OSError, ValueError):
+                    continue
+                self.downtimes.append(time.monotonic() - start)
+                print(f"Reconnected to {port} after {self.downtimes[-1] * 1000:.0f} ms")
+                return self.ser
+            time.sleep(self.retry_interval)
+        return None
+
+    @property
+    def downtime(self):
+        return sum(self.downtimes)
@@ -0,0 +1,61 @@
+import queue
+import numpy as np
+import threading
+from streaming_filter import capture_settings
+
+#Created By: Team E14
+#Runs saving in the background so the next recording can start straight away
+
+class RecordingSnapshot():
+    # Everything an export needs from a finished recording. The arrays are made read only (spooled
+    # recordings are already) and the menu starts new buffers for the next recording, so nothing here
+    # changes under the worker.
+    def __init__(self, raw, streamed_filtered, format, zero_phase, streamed_wav=False, streamed_csv=False,
+                 name="E14_44_1ksps", start_sample=0, streamed_raw=False, bytes_per_sample=2, sample_rate=44100, filter_band=None):
+        for array in (raw, streamed_filtered):
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+        self.raw = raw
+        self.streamed_filtered = streamed_filtered
+        self.format = format
+        self.zero_phase = zero_phase
+        self.streamed_wav = streamed_wav #.wav was already written during capture
+        self.streamed_csv = streamed_csv #.csv was already written during capture
+        self.name = name #output path without the extension
+        self.start_sample = start_sample
+        self.streamed_raw = streamed_raw #every frame was also written to name.e14raw during capture
+        self.bytes_per_sample = bytes_per_sample #2 for the 12-bit stream, 1 for the legacy 8-bit one
+        self.sample_rate = sample_rate
+        self.filter_band = capture_settings(sample_rate, bytes_per_sample)[0] if filter_band is None else filter_band #(low, high) Hz band pass
+
+class ExportWorker():
+    # One background thread working through a bounded queue of exports. When max_pending exports
+    # are already queued, submit() blocks, which holds capture back until saving catches up.
+    def __init__(self, max_pending=2):
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.completed = 0
+        self.failed = 0
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        self.jobs.put((function, args))
+
+    def full(self):
+        return self.jobs.full()
+
+    def wait(self):
+        # Blocks until every queued export has finished
+        self.jobs.join()
+
+    def __run(self):
+        while True:
+            function, args = self.jobs.get()
+            try:
+                function(*args)
+                self.completed += 1
+            except Exception as error:
+                self.failed += 1
+                print(f"Export failed: {error}")
+            finally:
+                self.jobs.task_done()
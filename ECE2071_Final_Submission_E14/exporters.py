@@ -0,0 +1,185 @@
+import os
+import gzip
+import struct
+import numpy as np
+
+#Created By: Team E14
+#Writers that export a recording while it is being captured
+
+WAV_HEADER_SIZE = 44
+
+# ASCII for every 4 digit group, zero padded (0000-9999), unpadded (0-9999, leading zeros as NUL) and blank
+_padded_digits = np.frombuffer("".join(f"{i:04d}" for i in range(10000)).encode(), dtype=np.uint8).reshape(10000, 4)
+_unpadded_digits = np.frombuffer("".join(f"{i:>4d}" for i in range(10000)).encode(), dtype=np.uint8).reshape(10000, 4).copy()
+_unpadded_digits[_unpadded_digits == ord(" ")] = 0
+_digit_table = np.vstack((_padded_digits, _unpadded_digits, np.zeros((1, 4), dtype=np.uint8))).view("<u4").ravel()
+
+def wav_header(sample_rate, data_size, channels=1, sample_width=2):
+    block_align = channels * sample_width
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, channels,
+                       sample_rate, sample_rate * block_align, block_align, sample_width * 8, b"data", data_size)
+
+class StreamingWavWriter():
+    # 16-bit mono WAV that is opened when recording starts and has frames appended as they are filtered.
+    # The RIFF and data sizes are patched every patch_interval writes and on close, so the file
+    # on disk is always a playable WAV and save time does not depend on the recording length.
+    def __init__(self, path, sample_rate, patch_interval=100):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.patch_interval = patch_interval
+        self.data_size = 0
+        self.__writes = 0
+        self.file = open(path, "wb")
+        self.file.write(wav_header(sample_rate, 0))
+
+    def write(self, samples):
+        # samples are signed 16-bit values, anything outside that range is clipped
+        data = np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+        self.file.write(data)
+        self.data_size += len(data)
+        self.__writes += 1
+        if self.__writes % self.patch_interval == 0:
+            self.__patch_header()
+
+    def close(self):
+        if not self.file.closed:
+            self.__patch_header()
+            self.file.close()
+
+    def __patch_header(self):
+        self.file.flush()
+        self.file.seek(0)
+        self.file.write(wav_header(self.sample_rate, self.data_size))
+        self.file.seek(0, os.SEEK_END)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def wav_interrupted(path):
+    # True for a WAV whose header does not cover the whole file, which is how a StreamingWavWriter
+    # that never reached close() leaves it (the sizes are only patched every patch_interval writes)
+    with open(path, "rb") as wav_file:
+        header = wav_file.read(WAV_HEADER_SIZE)
+    if len(header) < WAV_HEADER_SIZE or header[:4] != b"RIFF" or header[8:16] != b"WAVEfmt " or header[36:40] != b"data":
+        return False #not a WAV with the plain 44 byte header written here
+    data_size, = struct.unpack_from("<I", header, 40)
+    return data_size != os.path.getsize(path) - WAV_HEADER_SIZE
+
+def recover_wav(path):
+    # Fixes the header of a WAV left behind by a crash, using whatever whole samples reached the disk
+    with open(path, "r+b") as wav_file:
+        header = wav_file.read(WAV_HEADER_SIZE)
+        sample_rate, = struct.unpack_from("<I", header, 24)
+        block_align, = struct.unpack_from("<H", header, 32)
+        data_size = os.path.getsize(path) - WAV_HEADER_SIZE
+        data_size -= data_size % block_align
+        wav_file.seek(0)
+        wav_file.write(wav_header(sample_rate, data_size))
+        wav_file.truncate(WAV_HEADER_SIZE + data_size)
+    return data_size // block_align
+
+def _digit_groups(values):
+    # Number of 4 digit groups needed for the widest value, and whether a sign column is needed
+    if len(values) == 0:
+        return 1, False
+    low, high = int(values.min()), int(values.max())
+    return max(1, (len(str(max(abs(low), high))) + 3) // 4), low < 0
+
+def _digit_words(values, groups):
+    # Each 4 digit group of non-negative values as ASCII, one uint32 word per group, NUL where a row is shorter
+    for j in range(groups):
+        shift = 10**(4*(groups - 1 - j))
+        group = values // shift % 10000 if j else values // shift
+        if groups == 1:
+            index = 10000 + group
+        elif j == 0:
+            index = np.where(group > 0, 10000 + group, 20000)
+        else:
+            index = np.where(values >= shift * 10000, group, np.where((group > 0) | (j == groups - 1), 10000 + group, 20000))
+        yield _digit_table[index]
+
+def _fill_digits(out, values, groups, signed):
+    # Writes each value as ASCII into a (rows x 1 + 4*groups) uint8 block, NUL where a row is shorter
+    if signed:
+        out[:, 0] = np.where(values < 0, ord("-"), 0)
+        values = np.abs(values)
+    for j, words in enumerate(_digit_words(values, groups)):
+        out[:, 1 + 4*j:5 + 4*j] = words.view(np.uint8).reshape(-1, 4)
+
+_value_words = {} #line ending -> ",value" + line ending for 0-9999 as one uint64 word each, NUL padded
+
+def _small_value_words(line_end):
+    # The usual 12-bit and 8-bit samples fit in 8 bytes with the comma and line ending, so each
+    # row's value is a single table lookup
+    if line_end not in _value_words:
+        text = _unpadded_digits.reshape(-1, 4)
+        words = np.zeros((10000, 8), dtype=np.uint8)
+        words[:, 0] = ord(",")
+        words[:, 1:5] = text
+        words[:, 5:5 + len(line_end)] = np.frombuffer(line_end, dtype=np.uint8)
+        _value_words[line_end] = words.view("<u8").ravel()
+    return _value_words[line_end]
+
+def format_csv_rows(start, values, line_end=b"\r\n"):
+    # Formats "index,value" rows for a whole block of integer samples at once
+    if not np.issubdtype(values.dtype, np.integer):
+        rows = np.empty(2 * len(values), dtype=object)
+        rows[0::2] = range(start, start + len(values))
+        rows[1::2] = values.tolist()
+        return (("%d,%r" + line_end.decode()) * len(values) % tuple(rows)).encode()
+
+    dtype = np.int32 if start + len(values) < 2**31 and values.dtype.itemsize <= 2 else np.int64
+    values = values.astype(dtype)
+    index = np.arange(start, start + len(values), dtype=dtype)
+    index_groups, _ = _digit_groups(index)
+    if len(values) != 0 and len(line_end) <= 3 and int(values.min()) >= 0 and int(values.max()) < 10000:
+        # rows are whole words: the index groups as uint32 words, then the value and line ending as one uint64
+        rows = np.empty((len(values), index_groups + 2), dtype="<u4")
+        for j, words in enumerate(_digit_words(index, index_groups)):
+            rows[:, j] = words
+        rows[:, index_groups:].view("<u8")[:, 0] = _small_value_words(line_end)[values]
+        rows = rows.view(np.uint8)
+        return rows[rows != 0].tobytes()
+    value_groups, signed = _digit_groups(values)
+    index_width = 1 + 4*index_groups
+    value_width = 1 + 4*value_groups
+
+    rows = np.zeros((len(values), index_width + 1 + value_width + len(line_end)), dtype=np.uint8)
+    _fill_digits(rows[:, :index_width], index, index_groups, False)
+    rows[:, index_width] = ord(",")
+    _fill_digits(rows[:, index_width + 1:index_width + 1 + value_width], values, value_groups, signed)
+    rows[:, index_width + 1 + value_width:] = np.frombuffer(line_end, dtype=np.uint8)
+    return rows[rows != 0].tobytes()
+
+class StreamingCsvWriter():
+    # "Sample Index,16-bit Value" CSV written in large formatted blocks instead of one writerow per sample.
+    # Samples can be written all at once or a frame at a time during capture.
+    def __init__(self, path, header=("Sample Index", "16-bit Value"), compress=False, chunk_rows=16384, compresslevel=1):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        if compress:
+            self.file = gzip.open(path, "wb", compresslevel=compresslevel)
+        else:
+            self.file = open(path, "wb", buffering=1024*1024)
+        self.file.write((",".join(header) + "\r\n").encode())
+
+    def write(self, samples):
+        samples = np.asarray(samples).reshape(-1)
+        for i in range(0, len(samples), self.chunk_rows):
+            chunk = samples[i:i + self.chunk_rows]
+            self.file.write(format_csv_rows(self.rows, chunk))
+            self.rows += len(chunk)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
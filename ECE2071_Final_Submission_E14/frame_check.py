@@ -0,0 +1,94 @@
+import numpy as np
+
+#Created By: Team E14
+#Payload integrity checks, using the pad byte of the 0xFF 0xFF | in_range | pad | payload header as a check byte
+
+def xor_checksum(payloads):
+    # XOR of every byte in each frame (the idea from temp/ECE2071/checksum.py), one reduce over the frames x bytes array
+    return np.bitwise_xor.reduce(np.asarray(payloads, dtype=np.uint8), axis=1)
+
+def crc8_table(poly=0x07):
+    # The usual byte at a time CRC-8 lookup table
+    crc = np.arange(256, dtype=np.uint16)
+    for _ in range(8):
+        crc = np.where(crc & 0x80, (crc << 1) ^ poly, crc << 1) & 0xFF
+    return crc.astype(np.uint8)
+
+def crc8_position_table(payload_size, poly=0x07):
+    # With a zero start value CRC-8 is linear, so the CRC of a payload is the XOR of what each byte
+    # contributes on its own. Row k holds the CRC of value v at position k with zeros everywhere else:
+    # the last byte contributes table[v], and each byte before it goes through the table once more.
+    table = crc8_table(poly)
+    positions = np.empty((payload_size, 256), dtype=np.uint8)
+    row = table.copy()
+    for position in range(payload_size - 1, -1, -1):
+        positions[position] = row
+        row = table[row]
+    return positions
+
+def crc8(payloads, positions=None):
+    # CRC-8 (poly 0x07, start 0) of each frame as a single gather and XOR reduce
+    payloads = np.asarray(payloads, dtype=np.uint8)
+    if positions is None:
+        positions = crc8_position_table(payloads.shape[1])
+    return np.bitwise_xor.reduce(positions[np.arange(payloads.shape[1]), payloads], axis=1)
+
+class FrameChecker():
+    # Checks every frame a decoder returns against the check byte sent with it.
+    # method is "xor" or "crc8", and policy is what happens to a frame that fails:
+    #   "drop"     the frame is removed, the next frame is marked as a resync so the gap is recorded
+    #   "conceal"  the payload is replaced with the last good frame (mid-scale silence before there is one)
+    #   "flag"     the frame is kept as received and marked in last_corrupt, for raw captures
+    def __init__(self, method="xor", policy="conceal", silence=2048):
+        if method not in ("xor", "crc8"):
+            raise ValueError(f"unknown frame check {method!r}, use 'xor' or 'crc8'")
+        if policy not in ("drop", "conceal", "flag"):
+            raise ValueError(f"unknown corrupt frame policy {policy!r}, use 'drop', 'conceal' or 'flag'")
+        self.method = method
+        self.policy = policy
+        self.silence = silence #12-bit mid-scale
+
+        self.frames_checked = 0
+        self.frames_corrupt = 0
+        self.last_corrupt = np.empty(0, dtype=bool) #frames from the last check call that failed
+
+        self.__positions = None #crc8 table, built for the first payload size seen
+        self.__last_good = None
+
+    def checksums(self, payloads):
+        if self.method == "xor":
+            return xor_checksum(payloads)
+        if self.__positions is None or len(self.__positions) != payloads.shape[1]:
+            self.__positions = crc8_position_table(payloads.shape[1])
+        return crc8(payloads, self.__positions)
+
+    def check(self, payloads, in_range, checks):
+        # Returns (payloads, in_range, keep) with the policy applied. keep marks which of the frames
+        # passed in are still there, so per frame details kept alongside can be filtered to match.
+        good = self.checksums(payloads) == checks
+        self.frames_checked += len(good)
+        self.last_corrupt = ~good
+        keep = np.ones(len(good), dtype=bool)
+        if good.all():
+            if len(good) != 0:
+                self.__last_good = payloads[-1].copy()
+            return payloads, in_range, keep
+        self.frames_corrupt += int(np.count_nonzero(~good))
+
+        if self.policy == "drop":
+            keep = good
+            payloads, in_range = payloads[good], in_range[good]
+            self.last_corrupt = self.last_corrupt[good]
+        elif self.policy == "conceal":
+            # each bad frame takes the nearest good frame before it
+            source = np.maximum.accumulate(np.where(good, np.arange(len(good)), -1))
+            fill = self.__last_good
+            if fill is None or len(fill) != payloads.shape[1]:
+                fill = np.full(payloads.shape[1] // 2, self.silence, dtype="<u2").view(np.uint8)
+            payloads = np.concatenate((fill[None], payloads))[source + 1]
+        if good.any():
+            self.__last_good = (payloads[-1] if self.policy == "drop" else payloads[np.flatnonzero(good)[-1]]).copy()
+        return payloads, in_range, keep
+
+    def reset(self):
+        self.__last_good = None
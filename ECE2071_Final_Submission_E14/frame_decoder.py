@@ -0,0 +1,291 @@
+import time
+import numpy as np
+
+#Created By: Team E14
+#Decodes the 0xFF 0xFF | in_range | pad | payload frames sent by the processor
+
+def dominant_sync_spacing(data, sync_word=b"\xff\xff", min_spacing=8):
+    # Most common distance between sync words in a block of raw data, and the fraction of the block
+    # that spacing explains (near 1 for a framed stream, near 0 when the sync words are just sample values)
+    buf = np.frombuffer(bytes(data), dtype=np.uint8)
+    if len(buf) < 2 * min_spacing:
+        return 0, 0.0
+    matches = np.flatnonzero((buf[:-1] == sync_word[0]) & (buf[1:] == sync_word[1]))
+    gaps = np.diff(matches)
+    # a 0xFF 0xFF inside a payload splits one frame gap in two, so sums of neighbouring gaps are tried too
+    spacings = np.unique(np.concatenate((gaps, gaps[:-1] + gaps[1:])))
+    spacings = spacings[spacings >= min_spacing]
+    if len(spacings) == 0:
+        return 0, 0.0
+    counts = np.array([np.count_nonzero(np.isin(matches + spacing, matches)) for spacing in spacings])
+    best = int(np.argmax(counts))
+    spacing = int(spacings[best])
+    return spacing, min(1.0, counts[best] * spacing / len(buf))
+
+class FrameDecoder():
+    # With an empty sync_word and header_size=0 it cuts the unframed legacy stream into
+    # payload_size blocks instead, all marked in range, so both streams share one capture path.
+    # With detect_payload=True the payload size is measured from the spacing of the sync words in
+    # the first detect_window bytes, and measured again every verify_interval bytes or after a resync,
+    # since boards have shipped with 512, 612 and 1024 byte buffers.
+    # A FrameChecker given as checker tests each payload against the pad byte after in_range.
+    def __init__(self, payload_size=512, sync_word=b"\xff\xff", header_size=4, clock=time.time,
+                 detect_payload=False, detect_window=8192, verify_interval=1 << 20, checker=None):
+        self.payload_size = payload_size
+        self.sync_word = bytes(sync_word)
+        self.header_size = header_size
+        self.frame_size = header_size + payload_size
+        self.max_read_frames = 64 #upper limit on a single blocking read
+        self.clock = clock #stamps each frame's arrival
+        self.check_offset = len(self.sync_word) + 1 if 0 < len(self.sync_word) and len(self.sync_word) + 1 < header_size else None
+        self.checker = checker if self.check_offset is not None else None
+
+        self.detect_payload = detect_payload and len(self.sync_word) != 0
+        self.detect_window = detect_window
+        self.verify_interval = verify_interval
+        self.payload_locked = not self.detect_payload #False until the first measurement
+        self.payload_checks = 0
+        self.payload_changes = 0 #times the measured payload size differed from the one in use
+
+        self.frames_decoded = 0
+        self.bytes_skipped = 0
+        self.resyncs = 0 #times bytes had to be skipped to find the next frame
+        self.false_syncs = 0 #0xFF 0xFF found while searching that was not followed by another a frame later
+        self.sync_misses = 0 #frames dropped because their sync word, or the next frame's, was not where it was expected
+        self.lock_losses = 0 #times max_misses was passed and the stream had to be searched again
+        self.gaps = 0 #reconnects seen in the stream
+        self.max_misses = 3 #misses in a row before giving up on the current frame alignment
+        self.locked = False #True while frames are being found exactly a frame apart
+
+        # per frame details of the frames returned by the last feed/read_frames call
+        self.last_arrival = np.empty(0) #host clock() when the frame was decoded
+        self.last_resync = np.empty(0, dtype=bool) #bytes were skipped just before the frame
+        self.last_corrupt = np.empty(0, dtype=bool) #failed the checker, kept as received ("flag") or replaced ("conceal")
+        self.last_check = np.empty(0, dtype=np.uint8) #pad byte of each frame from the last feed call, where a check byte goes
+
+        self.__pending = b""
+        self.__skipped = False
+        self.__since_verify = 0
+        self.__verify_data = bytearray()
+        self.__carry = None
+        self.__dropped = False #the checker dropped the last frame of the previous call
+
+    def __empty(self):
+        self.last_arrival = np.empty(0)
+        self.last_resync = np.empty(0, dtype=bool)
+        self.last_corrupt = np.empty(0, dtype=bool)
+        self.last_check = np.empty(0, dtype=np.uint8)
+        return np.empty((0, self.payload_size), dtype=np.uint8), np.empty(0, dtype=np.uint8)
+
+    def __skip(self, count):
+        self.bytes_skipped += count
+        self.__skipped |= count > 0
+
+    def set_payload_size(self, payload_size):
+        self.payload_size = payload_size
+        self.frame_size = self.header_size + payload_size
+        self.locked = False
+
+    def __measure_payload(self, block):
+        spacing, support = dominant_sync_spacing(block, self.sync_word)
+        self.payload_checks += 1
+        if support >= 0.6 and spacing > self.header_size and spacing != self.frame_size:
+            old = self.payload_size
+            self.set_payload_size(spacing - self.header_size)
+            self.payload_changes += 1
+            print(f"Frame payload size changed from {old} to {self.payload_size} bytes after {self.frames_decoded} frames")
+
+    def __verify_payload(self, data, block):
+        # Returns False while the first window is still being collected
+        if not self.payload_locked:
+            if len(block) < self.detect_window:
+                return False
+            self.__measure_payload(block)
+            self.payload_locked = True
+            return True
+        self.__since_verify += len(data)
+        if self.__since_verify >= self.verify_interval:
+            self.__verify_data += data
+            if len(self.__verify_data) >= self.detect_window:
+                self.__measure_payload(self.__verify_data)
+                self.__verify_data = bytearray()
+                self.__since_verify = 0
+        return True
+
+    def feed(self, data):
+        # Takes any amount of raw serial data and returns every complete frame in it as
+        # (payloads, in_range) where payloads is a (frames x payload_size) uint8 array.
+        # Anything after the last complete frame is kept for the next call.
+        data = bytes(data)
+        block = self.__pending + data
+        if self.detect_payload and not self.__verify_payload(data, block):
+            self.__pending = block
+            return self.__empty()
+        buf = np.frombuffer(block, dtype=np.uint8)
+        starts = []
+        resync_runs = []
+        pos = 0
+
+        if len(self.sync_word) == 0: #unframed, every payload_size bytes is a block
+            count = len(block) // self.frame_size
+            starts.append(np.arange(count) * self.frame_size)
+            pos = count * self.frame_size
+
+        while len(self.sync_word) != 0:
+            if not self.locked:
+                found = block.find(self.sync_word, pos)
+                if found < 0:
+                    # keep a trailing 0xFF in case it is the first half of the next sync word
+                    keep = len(block) - 1 if block.endswith(self.sync_word[:1]) else len(block)
+                    self.__skip(keep - pos)
+                    pos = keep
+                    break
+                # only trust a sync word that has another one exactly a frame later, a 0xFF 0xFF
+                # inside a payload almost never does
+                confirm = found + self.frame_size
+                if confirm + len(self.sync_word) > len(block):
+                    self.__skip(found - pos)
+                    pos = found
+                    break
+                if block[confirm:confirm + len(self.sync_word)] != self.sync_word:
+                    self.false_syncs += 1
+                    self.__skip(found + 1 - pos)
+                    pos = found + 1
+                    continue
+                self.__skip(found - pos)
+                pos = found
+                self.locked = True
+
+            # frames normally arrive back to back, so check every expected sync word at once. A frame is only
+            # returned once the sync word of the frame after it is in place too: a frame that lost bytes on the
+            # wire ends in the next frame's header, so the last frame is held until the next sync word arrives.
+            count = (len(block) - pos - len(self.sync_word)) // self.frame_size + 1 #sync words there is data for
+            if count < 2:
+                break
+            candidates = pos + np.arange(count) * self.frame_size
+            aligned = (buf[candidates] == self.sync_word[0]) & (buf[candidates + 1] == self.sync_word[1])
+            run = count if aligned.all() else int(np.argmin(aligned)) #the first sync word is always in place while locked
+            frames = run - 1
+            missed = 0
+            if run == 1:
+                # the next sync word is missing. If the alignment is back within max_misses frames the sync word was
+                # damaged, the frame before it is whole and only the frames without a sync word are dropped.
+                # Otherwise bytes were lost from this frame, so it is dropped and the stream searched again from inside it.
+                found = np.flatnonzero(aligned[2:self.max_misses + 2])
+                if len(found) == 0:
+                    if count < self.max_misses + 2: #wait for enough data to decide
+                        break
+                    self.sync_misses += 1
+                    self.lock_losses += 1
+                    self.locked = False
+                    self.__skip(1)
+                    pos += 1
+                    continue
+                frames = 1
+                missed = int(found[0]) + 1
+            if self.__skipped:
+                resync_runs.append(sum(len(s) for s in starts))
+                self.resyncs += 1
+                self.__skipped = False
+                self.__since_verify = self.verify_interval #lost sync, measure the payload size again soon
+            starts.append(candidates[:frames])
+            pos += (frames + missed) * self.frame_size
+            if missed != 0:
+                self.sync_misses += missed
+                self.__skip(missed * self.frame_size)
+
+        self.__pending = block[pos:]
+
+        if len(starts) == 0:
+            return self.__empty()
+
+        starts = np.concatenate(starts)
+        self.last_resync = np.zeros(len(starts), dtype=bool)
+        self.last_resync[resync_runs] = True
+        self.last_corrupt = np.zeros(len(starts), dtype=bool)
+        offsets = starts[:, None] + self.header_size + np.arange(self.payload_size)
+        payloads = buf[offsets]
+        in_range = np.ones(len(starts), dtype=np.uint8) if len(self.sync_word) == 0 else buf[starts + len(self.sync_word)]
+        self.last_check = np.zeros(len(starts), dtype=np.uint8) if self.check_offset is None else buf[starts + self.check_offset]
+
+        if self.checker is not None:
+            payloads, in_range, keep = self.checker.check(payloads, in_range, self.last_check)
+            self.last_corrupt = self.checker.last_corrupt
+            if not keep.all() or self.__dropped:
+                # a dropped frame leaves a gap in the samples, recorded as a resync on the frame after it
+                dropped = np.concatenate(([self.__dropped], ~keep))
+                self.last_resync = (self.last_resync | dropped[:-1])[keep]
+                self.last_check = self.last_check[keep]
+                self.__dropped = bool(dropped[-1])
+
+        self.last_arrival = np.full(len(payloads), self.clock())
+        self.frames_decoded += len(payloads)
+        return payloads, in_range
+
+    def read_frames(self, ser, min_frames=1, exact=False):
+        # Reads from the serial port in large blocks until at least min_frames are decoded.
+        # With exact=True it only reads the bytes still missing from min_frames, nothing past them.
+        # If the measured payload size changes, it returns early so min_frames can be worked out again.
+        payload_size = self.payload_size
+        payloads = []
+        in_range = []
+        arrival = []
+        resync = []
+        corrupt = []
+        total = 0
+        if self.__carry is not None: #frames left over from a payload size change
+            payloads, in_range, arrival, resync, corrupt = [[part] for part in self.__carry]
+            total = len(in_range[0])
+            self.__carry = None
+        while total < min_frames:
+            size = self.frame_size * min(min_frames - total, self.max_read_frames)
+            if exact and self.payload_locked:
+                size = max(size + len(self.sync_word) - len(self.__pending), 1) #and the next sync word, which confirms the last frame
+            else:
+                size = max(ser.in_waiting, size)
+            data = ser.read(size)
+            if len(data) == 0:
+                break
+            if getattr(ser, "take_gap", None) is not None and ser.take_gap():
+                self.mark_gap()
+            new_payloads, new_in_range = self.feed(data)
+            if len(new_payloads) == 0:
+                continue
+            if len(payloads) != 0 and new_payloads.shape[1] != payloads[0].shape[1]:
+                # the payload size changed, hand back the frames of the old size first
+                self.__carry = (new_payloads, new_in_range, self.last_arrival, self.last_resync, self.last_corrupt)
+                break
+            payloads.append(new_payloads)
+            in_range.append(new_in_range)
+            arrival.append(self.last_arrival)
+            resync.append(self.last_resync)
+            corrupt.append(self.last_corrupt)
+            total += len(new_in_range)
+            if self.payload_size != payload_size:
+                break
+
+        if len(payloads) == 0:
+            return self.__empty()
+        self.last_arrival = np.concatenate(arrival)
+        self.last_resync = np.concatenate(resync)
+        self.last_corrupt = np.concatenate(corrupt)
+        return np.concatenate(payloads), np.concatenate(in_range)
+
+    def mark_gap(self):
+        # The connection dropped before the next data: the partial frame from before is thrown away and
+        # the first frame after the gap is marked as a resync
+        self.__skip(len(self.__pending))
+        self.__pending = b""
+        self.__skipped = True
+        self.locked = False
+        self.gaps += 1
+
+    def reset(self):
+        # Drops any partial frame, the measured payload size is kept
+        self.__pending = b""
+        self.__skipped = False
+        self.__carry = None
+        self.__dropped = False
+        self.locked = False
+        if self.checker is not None:
+            self.checker.reset()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import argparse
+import threading
+import serial
+import serial.tools.list_ports
+from frame_decoder import FrameDecoder
+from frame_check import FrameChecker
+from acquisition import SerialReader
+from capture_file import CaptureFileWriter
+from connection import ConnectionSupervisor
+
+#Created By: Team E14
+#Records every connected sampler/processor pair at once, run with: python multi_capture.py --seconds 10
+
+def find_stm_ports(match="STM"):
+    # Every serial port whose description mentions the STM32 ST-Link, not just the last one
+    return [device.device for device in serial.tools.list_ports.comports() if match in str(device)]
+
+class SharedClock():
+    # One monotonic clock for every device. Readings are in unix seconds, anchored once when the clock
+    # is made, so arrival times from different boards line up and cannot jump with the system time.
+    def __init__(self):
+        self.wall_start = time.time()
+        self.monotonic_start = time.monotonic()
+
+    def __call__(self):
+        return self.wall_start + (time.monotonic() - self.monotonic_start)
+
+class DeviceCapture():
+    # One board: a SerialReader thread draining the port, and a second thread decoding frames
+    # from its ring buffer into the board's own .e14raw file. With a checksum ("xor" or "crc8") frames
+    # that fail their check byte are kept as received and flagged in the file. If the board is unplugged
+    # it is reopened (only the same board, by USB serial number) and the capture carries on after a gap.
+    def __init__(self, port, path, clock, baud_rate=921600, sample_rate=44100, payload_size=512, checksum=None):
+        self.port = port
+        self.path = path
+        self.baud_rate = baud_rate
+        checker = None if checksum is None else FrameChecker(checksum, "flag")
+        self.decoder = FrameDecoder(payload_size, clock=clock, detect_payload=True, checker=checker)
+        self.writer = CaptureFileWriter(path, sample_rate, payload_size, start_time=clock.wall_start)
+        self.supervisor = ConnectionSupervisor(baud_rate, match=None)
+        self.reader = None
+        self.thread = None
+        self.error = None
+
+    @property
+    def frames(self):
+        return self.writer.frame_count
+
+    def start(self):
+        self.reader = SerialReader(self.supervisor.open(self.port), supervisor=self.supervisor)
+        self.reader.start()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.reader is not None:
+            self.reader.stop() #closes the ring, which ends the decode thread once it is drained
+        if self.thread is not None:
+            self.thread.join()
+        if self.supervisor.ser is not None:
+            self.supervisor.ser.close()
+        self.writer.close()
+        self.error = self.error or (self.reader.error if self.reader is not None else None)
+
+    def __run(self):
+        try:
+            while True:
+                payloads, in_range = self.decoder.read_frames(self.reader.buffer)
+                if len(payloads) == 0: #ring closed and empty
+                    break
+                self.writer.write(payloads, in_range, self.decoder.last_arrival, self.decoder.last_resync, self.decoder.last_corrupt)
+        except OSError as error:
+            self.error = error
+
+class CaptureManager():
+    # Captures from several boards at the same time, each on its own threads and into its own file,
+    # all stamped with the same SharedClock. A manifest.json lists which file came from which port.
+    def __init__(self, ports=None, folder=None, baud_rate=921600, sample_rate=44100, payload_size=512, checksum=None):
+        self.ports = find_stm_ports() if ports is None else list(ports)
+        self.folder = folder or time.strftime("E14_multi_%Y%m%d_%H%M%S")
+        self.clock = SharedClock()
+        self.devices = []
+        if len(self.ports) != 0:
+            os.makedirs(self.folder, exist_ok=True)
+        for number, port in enumerate(self.ports, 1):
+            path = os.path.join(self.folder, f"E14_44_1ksps_device{number}.e14raw")
+            self.devices.append(DeviceCapture(port, path, self.clock, baud_rate, sample_rate, payload_size, checksum))
+
+    def start(self):
+        for device in self.devices:
+            device.start()
+
+    def stop(self):
+        for device in self.devices:
+            device.stop()
+        self.__write_manifest()
+
+    def record(self, seconds):
+        self.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            self.stop()
+
+    def __write_manifest(self):
+        manifest = {
+            "clock_start": self.clock.wall_start,
+            "devices": [{"port": device.port, "path": os.path.basename(device.path), "frames": device.frames,
+                         "resyncs": device.decoder.resyncs, "reconnects": device.supervisor.disconnects,
+                         "downtime": device.supervisor.downtime,
+                         "corrupt": 0 if device.decoder.checker is None else device.decoder.checker.frames_corrupt,
+                         "error": None if device.error is None else str(device.error)}
+                        for device in self.devices],
+        }
+        with open(os.path.join(self.folder, "manifest.json"), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record from every connected STM32 at once")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ports", nargs="*", help="ports to record from, default every STM port found")
+    parser.add_argument("--folder")
+    parser.add_argument("--checksum", choices=["xor", "crc8"], help="check byte the firmware sends in the pad byte")
+    args = parser.parse_args()
+
+    manager = CaptureManager(args.ports, args.folder, checksum=args.checksum)
+    if len(manager.devices) == 0:
+        print("No STM32 ports found")
+    else:
+        print(f"Recording {len(manager.devices)} devices for {args.seconds} s: {', '.join(manager.ports)}")
+        start = time.perf_counter()
+        manager.record(args.seconds)
+        elapsed = time.perf_counter() - start
+        for device in manager.devices:
+            print(f"  {device.port}: {device.frames} frames -> {device.path}" + ("" if device.error is None else f" (stopped: {device.error})"))
+        print(f"Aggregate {sum(device.frames for device in manager.devices) / elapsed:.0f} frames/s")
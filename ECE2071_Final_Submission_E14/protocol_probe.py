@@ -0,0 +1,113 @@
+import time
+import numpy as np
+from frame_decoder import FrameDecoder, dominant_sync_spacing
+from frame_check import FrameChecker, xor_checksum, crc8
+
+#Created By: Team E14
+#Works out which firmware is on the other end of the port before capture starts
+
+class Protocol():
+    # Everything the host needs to know about one wire format. checksum is "xor" or "crc8" when the
+    # firmware sends a check byte in the pad byte of each header, None when the pad byte is unused.
+    def __init__(self, name, baud_rate, sample_rate, bytes_per_sample, payload_size=512, sync_word=b"", header_size=0, checksum=None):
+        self.name = name
+        self.baud_rate = baud_rate
+        self.sample_rate = sample_rate
+        self.bytes_per_sample = bytes_per_sample
+        self.payload_size = payload_size
+        self.sync_word = sync_word
+        self.header_size = header_size
+        self.checksum = checksum
+
+    def decoder(self, check_policy="conceal", **kwargs):
+        # Framed decoders keep checking the payload size in case the board is reflashed
+        checker = None if self.checksum is None else FrameChecker(self.checksum, check_policy)
+        return FrameDecoder(self.payload_size, self.sync_word, self.header_size, detect_payload=True, checker=checker, **kwargs)
+
+    def with_payload_size(self, payload_size):
+        return Protocol(self.name, self.baud_rate, self.sample_rate, self.bytes_per_sample, payload_size, self.sync_word, self.header_size, self.checksum)
+
+    def __repr__(self):
+        checked = "" if self.checksum is None else f", {self.checksum} checked"
+        return f"{self.name} ({self.sample_rate} Hz, {self.baud_rate} baud, {self.payload_size} byte payloads{checked})"
+
+# 0xFF 0xFF | in_range | pad | payload of 12-bit little endian samples, from audio_interface_final.py
+FRAMED = Protocol("framed 12-bit", 921600, 44100, 2, 512, b"\xff\xff", 4)
+# raw 8-bit samples with no framing, from the MVP scripts
+LEGACY = Protocol("legacy 8-bit", 115200, 5000, 1)
+
+class ProbeResult():
+    def __init__(self, protocol, bytes_read, byte_rate, sync_spacing, sync_support, distinct_values):
+        self.protocol = protocol #None if nothing matched
+        self.bytes_read = bytes_read
+        self.byte_rate = byte_rate
+        self.sync_spacing = sync_spacing
+        self.sync_support = sync_support
+        self.distinct_values = distinct_values
+
+def detect_checksum(data, protocol, threshold=0.9, min_frames=8):
+    # Which check byte, if any, the pad bytes of the frames in data hold. Older firmware sends 0 there, which
+    # also matches any payload whose check works out to 0 (a flat signal, e.g. 0x00 0x08 repeated, has an XOR
+    # and CRC-8 of 0). So only frames with a non-zero check byte count, and there have to be min_frames of them
+    # with different payloads.
+    decoder = FrameDecoder(protocol.payload_size, protocol.sync_word, protocol.header_size)
+    payloads, _ = decoder.feed(data)
+    sent = decoder.last_check != 0
+    payloads, checks = payloads[sent], decoder.last_check[sent]
+    if len(payloads) < min_frames or len(np.unique(payloads, axis=0)) < min_frames:
+        return None
+    for method, checksums in (("xor", xor_checksum), ("crc8", crc8)):
+        if np.mean(checksums(payloads) == checks) >= threshold:
+            return method
+    return None
+
+def classify(data, byte_rate, baud_rate, sync_threshold=0.6):
+    # Picks a protocol for a block read at baud_rate:
+    #  - framed if 0xFF 0xFF repeats at one spacing that covers most of the block (the spacing gives the payload
+    #    size), with frame checks turned on if the pad bytes match the payloads
+    #  - legacy if there is no sync periodicity, the bytes take many values like audio does (a baud mismatch
+    #    gives a handful of values such as 0x00, 0x80 and 0xFF) and the rate is near 5000 samples/s
+    spacing, support = dominant_sync_spacing(data)
+    distinct = len(np.unique(np.frombuffer(bytes(data), dtype=np.uint8)))
+    protocol = None
+    if support >= sync_threshold:
+        protocol = FRAMED.with_payload_size(spacing - FRAMED.header_size)
+        protocol.baud_rate = baud_rate
+        protocol.checksum = detect_checksum(data, protocol)
+    elif distinct >= 16 and 0.5 * LEGACY.sample_rate <= byte_rate <= 2 * LEGACY.sample_rate:
+        protocol = Protocol(LEGACY.name, baud_rate, LEGACY.sample_rate, LEGACY.bytes_per_sample, LEGACY.payload_size)
+    return ProbeResult(protocol, len(data), byte_rate, spacing, support, distinct)
+
+def read_window(ser, window, max_seconds):
+    # Reads up to window bytes, timing from the first byte so data queued before the probe is not counted
+    ser.reset_input_buffer()
+    data = bytearray()
+    first = None
+    deadline = time.perf_counter() + max_seconds
+    while len(data) < window and time.perf_counter() < deadline:
+        chunk = ser.read(min(max(ser.in_waiting, 1), window - len(data)))
+        if len(chunk) != 0 and first is None:
+            first = time.perf_counter()
+            first_size = len(chunk)
+        data += chunk
+    if first is None or len(data) == first_size:
+        return bytes(data), 0.0
+    return bytes(data), (len(data) - first_size) / (time.perf_counter() - first)
+
+def probe(ser, candidates=(FRAMED, LEGACY), window=8192, max_seconds=1.5):
+    # Tries each candidate's baud rate in turn and returns the first ProbeResult that matches, or the
+    # last result (protocol None) if none did. The port is left at the detected baud rate.
+    timeout = ser.timeout
+    ser.timeout = 0.1
+    try:
+        for candidate in candidates:
+            if ser.baudrate != candidate.baud_rate:
+                ser.baudrate = candidate.baud_rate
+            data, byte_rate = read_window(ser, window, max_seconds)
+            result = classify(data, byte_rate, candidate.baud_rate)
+            if result.protocol is not None:
+                return result
+        ser.baudrate = candidates[0].baud_rate
+        return result
+    finally:
+        ser.timeout = timeout
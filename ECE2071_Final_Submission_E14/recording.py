@@ -0,0 +1,83 @@
+import os
+import numpy as np
+from capture_file import CaptureFile
+
+#Created By: Team E14
+#Opens saved recordings without loading them into memory
+
+def get_items(index, length, read, dtype, what="item", chunk_items=1 << 20):
+    # Indexing and slicing for sequences stored in pieces on disk. read(start, stop) returns items
+    # start to stop as an array. A slice reads the range it covers and steps through it, a strided
+    # slice (e.g. rec[::1000]) a chunk of at most chunk_items at a time so the whole range is never in memory.
+    if isinstance(index, slice):
+        indices = range(*index.indices(length))
+        if len(indices) == 0:
+            return np.empty(0, dtype=dtype)
+        per_read = len(indices) if abs(indices.step) == 1 else max(1, chunk_items // abs(indices.step))
+        parts = []
+        for first in range(0, len(indices), per_read):
+            part = indices[first:first + per_read]
+            low, high = min(part[0], part[-1]), max(part[0], part[-1]) + 1
+            parts.append(read(low, high)[part.start - low::part.step])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+    position = int(index) + length if int(index) < 0 else int(index)
+    if not 0 <= position < length:
+        raise IndexError(f"{what} {index} is out of range for {length} {what}s")
+    return read(position, position + 1)[0]
+
+class Recording():
+    # A recording on disk as a sliceable sequence of samples. .e14raw captures are decoded to 12-bit
+    # (or legacy 8-bit) samples and .npy files are used as saved, both through a memory map, so only the samples that
+    # are sliced or iterated over are ever read. Slices of a .npy are views into the map. Iterating
+    # yields blocks of samples rather than single samples.
+    def __init__(self, path, sample_rate, length, dtype, capture=None, array=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.length = length
+        self.dtype = dtype
+        self.capture = capture
+        self.array = array
+
+    @classmethod
+    def open(cls, path, sample_rate=None):
+        # sample_rate is read from .e14raw files, .npy files do not store one (default 44100 Hz)
+        if os.path.splitext(path)[1] == ".e14raw":
+            capture = CaptureFile(path)
+            dtype = np.dtype(np.uint16 if capture.bytes_per_sample == 2 else np.uint8)
+            return cls(path, capture.sample_rate, capture.sample_count, dtype, capture=capture)
+        array = np.load(path, mmap_mode="r").reshape(-1)
+        return cls(path, sample_rate or 44100, len(array), array.dtype, array=array)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def duration(self):
+        return self.length / self.sample_rate
+
+    def __getitem__(self, index):
+        return get_items(index, self.length, self.__read, self.dtype, "sample")
+
+    def __read(self, start, stop):
+        if self.array is not None:
+            return self.array[start:stop]
+        samples_per_frame = self.capture.samples_per_frame
+        first = start // samples_per_frame
+        last = -(-stop // samples_per_frame)
+        offset = first * samples_per_frame
+        return self.capture.samples(first, last)[start - offset:stop - offset]
+
+    def chunks(self, chunk_size=1 << 20, dtype=None):
+        # Yields the recording chunk_size samples at a time, converted to dtype if one is given
+        for start in range(0, self.length, chunk_size):
+            chunk = self[start:start + chunk_size]
+            yield chunk if dtype is None else chunk.astype(dtype)
+
+    def __iter__(self):
+        return self.chunks()
+
+    def mean(self, chunk_size=1 << 20):
+        total = 0.0
+        for chunk in self.chunks(chunk_size):
+            total += float(np.sum(chunk, dtype=np.float64))
+        return total / self.length if self.length else 0.0
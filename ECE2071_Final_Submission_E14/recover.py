@@ -0,0 +1,85 @@
+import os
+import glob
+import time
+import argparse
+from capture_file import CaptureFile, capture_interrupted
+from streaming_filter import StreamingFilter, capture_settings
+from exporters import StreamingWavWriter, StreamingCsvWriter, wav_interrupted, recover_wav
+
+#Created By: Team E14
+#Rebuilds the exports of recordings that were cut off by a crash or a pulled cable, run with: python recover.py [folder or .e14raw ...]
+#Every frame of a capture is journaled to its .e14raw file as it arrives, so that file is what gets recovered from.
+#Recordings made without the journal (save_raw_capture off) only have their streamed .wav, which gets its header fixed.
+
+def is_interrupted(path):
+    # A journal that was never closed, or a streamed .wav that was never closed and has no journal to rebuild it from
+    if os.path.splitext(path)[1] == ".e14raw":
+        return capture_interrupted(path)
+    return not os.path.exists(os.path.splitext(path)[0] + ".e14raw") and wav_interrupted(path)
+
+def find_interrupted(folder="."):
+    # Interrupted .e14raw and .wav files in folder and the session folders inside it
+    paths = []
+    for extension in (".e14raw", ".wav"):
+        paths += sorted(glob.glob(os.path.join(folder, "*" + extension)) + glob.glob(os.path.join(folder, "*", "*" + extension)))
+    return [path for path in paths if is_interrupted(path)]
+
+def set_aside(name, extensions=(".e14raw", ".wav", ".csv")):
+    # Renames the files of an interrupted recording called name (no extension) to name_interrupted_<time>
+    # so a new recording with the same name does not write over them. Returns the new name, or None
+    # (and renames nothing) if that recording was not interrupted.
+    if not any(os.path.exists(name + extension) and is_interrupted(name + extension) for extension in (".e14raw", ".wav")):
+        return None
+    paths = [name + extension for extension in extensions if os.path.exists(name + extension)]
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(max(os.path.getmtime(path) for path in paths)))
+    new_name = f"{name}_interrupted_{stamp}"
+    count = 1
+    while any(os.path.exists(new_name + extension) for extension in extensions):
+        count += 1
+        new_name = f"{name}_interrupted_{stamp}_{count}"
+    for path in paths:
+        os.rename(path, new_name + os.path.splitext(path)[1])
+    return new_name
+
+def recover(path, formats=(".wav",), frames_per_chunk=1024):
+    # Writes name.wav and/or name.csv next to path from every whole frame in the journal, filtered the
+    # same way as during capture, then closes off the journal. Returns the paths written.
+    # A .wav path is fixed in place instead, keeping every whole sample that reached the disk.
+    if os.path.splitext(path)[1] == ".wav":
+        samples = recover_wav(path)
+        print(f"Recovered {samples} samples of {path}")
+        return [path]
+    capture = CaptureFile(path)
+    name = os.path.splitext(path)[0]
+    rate = capture.sample_rate
+    filter_band, wav_gain = capture_settings(rate, capture.bytes_per_sample)
+    stream_filter = StreamingFilter(*filter_band, rate)
+    wav_sink = StreamingWavWriter(name + ".wav", rate) if ".wav" in formats else None
+    csv_sink = StreamingCsvWriter(name + ".csv") if ".csv" in formats else None
+    try:
+        for samples in capture.chunks(frames_per_chunk):
+            if csv_sink is not None:
+                csv_sink.write(samples)
+            if wav_sink is not None:
+                wav_sink.write(stream_filter.process(samples) * wav_gain)
+    finally:
+        for sink in (wav_sink, csv_sink):
+            if sink is not None:
+                sink.close()
+    capture.finish()
+    print(f"Recovered {capture.duration:.1f} s ({capture.frame_count} frames) from {path}")
+    return [sink.path for sink in (wav_sink, csv_sink) if sink is not None]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild .wav/.csv files from interrupted capture journals")
+    parser.add_argument("paths", nargs="*", default=["."], help=".e14raw or streamed .wav files, or folders to search for interrupted ones")
+    parser.add_argument("--format", nargs="+", choices=[".wav", ".csv"], default=[".wav"])
+    args = parser.parse_args()
+
+    journals = []
+    for path in args.paths:
+        journals += find_interrupted(path) if os.path.isdir(path) else [path]
+    if len(journals) == 0:
+        print("No interrupted recordings found")
+    for journal in journals:
+        recover(journal, args.format)
@@ -0,0 +1,40 @@
+import numpy as np
+
+#Created By: Team E14
+#Turns the raw payload bytes into 12-bit ADC samples
+
+def as_array(data):
+    # Serial reads (bytes, bytearray, memoryview) as a uint8 array without copying, arrays as they are
+    return np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray, memoryview)) else np.asarray(data)
+
+def decode_12bit(data):
+    # Each sample is sent as LSB then MSB, so the bytes are already a little endian uint16
+    # array. Only the lower 12 bits are the ADC value, the upper 4 bits are discarded.
+    data = as_array(data).reshape(-1)
+    data = data[:len(data) - len(data) % 2]
+    return np.ascontiguousarray(data).view("<u2") & 0x0FFF
+
+def decode_8bit(data):
+    # The legacy unframed stream sends one byte per sample
+    return as_array(data).reshape(-1)
+
+def decode_samples(data, bytes_per_sample=2):
+    return decode_12bit(data) if bytes_per_sample == 2 else decode_8bit(data)
+
+class SampleDecoder():
+    # Decodes payloads one frame at a time, holding on to a split LSB until the next frame
+    def __init__(self, bytes_per_sample=2):
+        self.bytes_per_sample = bytes_per_sample
+        self.__leftover = np.empty(0, dtype=np.uint8)
+
+    def decode(self, payload):
+        payload = as_array(payload).reshape(-1)
+        if self.bytes_per_sample == 1:
+            return decode_8bit(payload)
+        if len(self.__leftover) != 0:
+            payload = np.concatenate((self.__leftover, payload))
+        self.__leftover = payload[len(payload) - len(payload) % 2:].copy()
+        return decode_12bit(payload)
+
+    def reset(self):
+        self.__leftover = np.empty(0, dtype=np.uint8)
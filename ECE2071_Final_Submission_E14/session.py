@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import threading
+
+#Created By: Team E14
+#Unattended distance trigger sessions, every in range episode saved as its own segment
+
+class SegmentSession():
+    # Gives each segment a numbered, timestamped name inside the session folder and keeps
+    # manifest.json up to date as segments finish exporting. Start samples count every sample
+    # received since the session started, so segments can be lined up against each other.
+    def __init__(self, sample_rate, folder=None, prefix="E14_44_1ksps"):
+        self.sample_rate = sample_rate
+        self.prefix = prefix
+        self.started = time.time()
+        self.folder = folder or time.strftime("E14_session_%Y%m%d_%H%M%S", time.localtime(self.started))
+        self.manifest_path = os.path.join(self.folder, "manifest.json")
+        self.segment_count = 0
+        self.segments = []
+        self.ended = None
+        self.lock = threading.Lock() #segments are added from the export worker
+
+        os.makedirs(self.folder, exist_ok=True)
+        self.__write()
+
+    def new_segment(self):
+        # Base path (no extension) for the next segment
+        self.segment_count += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        return os.path.join(self.folder, f"{self.prefix}_{self.segment_count:03d}_{stamp}")
+
+    def add_segment(self, base_name, start_sample, samples, paths):
+        with self.lock:
+            self.segments.append({
+                "segment": os.path.basename(base_name),
+                "start_sample": int(start_sample),
+                "start_time": start_sample / self.sample_rate,
+                "samples": int(samples),
+                "duration": samples / self.sample_rate,
+                "paths": [os.path.relpath(path, self.folder) for path in paths],
+            })
+            self.__write()
+
+    def close(self):
+        with self.lock:
+            self.ended = time.time()
+            self.__write()
+
+    def __write(self):
+        # Written to a temporary file and renamed, so the manifest on disk is always complete
+        manifest = {
+            "sample_rate": self.sample_rate,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "ended": None if self.ended is None else time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.ended)),
+            "segments": self.segments,
+        }
+        temporary = self.manifest_path + ".tmp"
+        with open(temporary, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temporary, self.manifest_path)
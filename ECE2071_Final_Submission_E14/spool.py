@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+from recording import get_items
+from sample_decode import as_array
+
+#Created By: Team E14
+#Recording buffers kept on disk in fixed size memory mapped segments, so capture length is not limited by RAM
+
+class SpoolFiles():
+    # The segment files of one spool. The folder is deleted once nothing refers to it any more,
+    # which is after the SpoolBuffer is cleared and every SpoolArray handed to an export is done with.
+    def __init__(self, folder=None):
+        self.folder = tempfile.mkdtemp(prefix="E14_spool_", dir=folder)
+        self.paths = []
+        weakref.finalize(self, shutil.rmtree, self.folder, True)
+
+    def new_path(self):
+        self.paths.append(os.path.join(self.folder, f"segment_{len(self.paths):05d}.bin"))
+        return self.paths[-1]
+
+class SpoolBuffer():
+    # Drop in for CaptureBuffer. Appended data goes into a memory mapped segment file of segment_size
+    # bytes, and when it fills the segment is flushed and unmapped and a new one started, so only the
+    # segment being written is ever mapped and memory use stays the same however long the capture runs.
+    def __init__(self, segment_size=32 * 1024 * 1024, dtype=np.uint8, folder=None):
+        self.dtype = np.dtype(dtype)
+        self.segment_items = max(1, segment_size // self.dtype.itemsize)
+        self.folder = folder #where the spool folder is made, default the system temp folder
+        self.files = None
+        self.lengths = [] #items in each segment
+        self.length = 0
+        self.__segment = None #the segment being written
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, capacity):
+        pass #segments are made as they are needed
+
+    def __roll(self):
+        if self.__segment is not None:
+            self.__segment.flush()
+        if self.files is None:
+            self.files = SpoolFiles(self.folder)
+        self.__segment = np.memmap(self.files.new_path(), dtype=self.dtype, mode="w+", shape=(self.segment_items,))
+        self.lengths.append(0)
+
+    def append(self, data):
+        data = as_array(data).reshape(-1)
+        while len(data) != 0:
+            if self.__segment is None or self.lengths[-1] == self.segment_items:
+                self.__roll()
+            used = self.lengths[-1]
+            count = min(len(data), self.segment_items - used)
+            self.__segment[used:used + count] = data[:count]
+            self.lengths[-1] += count
+            self.length += count
+            data = data[count:]
+
+    def view(self):
+        # Everything appended so far as one read only array like object
+        if self.__segment is not None:
+            self.__segment.flush()
+        return SpoolArray(self.files, list(self.lengths), self.dtype)
+
+    def clear(self):
+        # Starts again with new files, views already taken keep the old ones until they are dropped
+        self.__segment = None
+        self.files = None
+        self.lengths = []
+        self.length = 0
+
+class SpoolArray():
+    # The segments of a spool as a single sequence of items. Indexing and slicing return ordinary
+    # arrays, reading only the segments they cover, and np.asarray() reads the whole thing.
+    def __init__(self, files, lengths, dtype):
+        self.files = files
+        self.lengths = lengths
+        self.dtype = dtype
+        self.offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        self.length = int(self.offsets[-1])
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def shape(self):
+        return (self.length,)
+
+    def __read(self, start, stop):
+        out = np.empty(max(0, stop - start), dtype=self.dtype)
+        first = max(0, int(np.searchsorted(self.offsets, start, side="right")) - 1)
+        for segment in range(first, len(self.lengths)):
+            low, high = int(self.offsets[segment]), int(self.offsets[segment + 1])
+            if low >= stop:
+                break
+            begin, end = max(start, low), min(stop, high)
+            if begin < end:
+                mapped = np.memmap(self.files.paths[segment], dtype=self.dtype, mode="r", shape=(self.lengths[segment],))
+                out[begin - start:end - start] = mapped[begin - low:end - low]
+                del mapped #unmap straight away
+        return out
+
+    def __getitem__(self, index):
+        return get_items(index, self.length, self.__read, self.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.__read(0, self.length)
+        return data if dtype is None else data.astype(dtype)
+
+    def chunks(self, chunk_size=1 << 20):
+        for start in range(0, self.length, chunk_size):
+            yield self.__read(start, min(start + chunk_size, self.length))
+
+    def __iter__(self):
+        return self.chunks()
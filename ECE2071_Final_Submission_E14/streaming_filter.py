@@ -0,0 +1,41 @@
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
+
+#Created By: Team E14
+#Butterworth filtering in second order sections, either streamed frame by frame or zero-phase offline
+
+def butter_sos(lowcut, highcut, sample_rate, filter_type="bandpass", order=5):
+    nyquist = 0.5 * sample_rate
+    low = lowcut / nyquist
+    high = highcut / nyquist
+    return butter(order, [low, high], btype=filter_type, analog=False, output="sos")
+
+def capture_settings(sample_rate, bytes_per_sample=2):
+    # (filter band, streamed .wav gain) used while capturing, recover.py uses the same so a rebuilt
+    # recording matches the one that would have been saved
+    band = (30, min(10000, 0.4 * sample_rate)) #high cut has to stay below Nyquist for the 5 kHz stream
+    gain = 16 if bytes_per_sample == 2 else 256 #12-bit (or 8-bit) ADC counts to 16-bit samples
+    return band, gain
+
+def zero_phase_filter(data, lowcut, highcut, sample_rate, filter_type="bandpass", order=5):
+    # Offline forward-backward filter for the final export, needs the whole recording
+    return sosfiltfilt(butter_sos(lowcut, highcut, sample_rate, filter_type, order), data)
+
+class StreamingFilter():
+    # Causal filter that keeps its state (zi) between calls, so each decoded frame can be
+    # filtered as it arrives and the output is the same as filtering the whole recording at once
+    def __init__(self, lowcut, highcut, sample_rate, filter_type="bandpass", order=5):
+        self.sos = butter_sos(lowcut, highcut, sample_rate, filter_type, order)
+        self.zi = None
+
+    def process(self, samples):
+        if len(samples) == 0:
+            return np.empty(0)
+        if self.zi is None:
+            # start from steady state on the first sample so the DC offset does not ring
+            self.zi = sosfilt_zi(self.sos) * samples[0]
+        filtered, self.zi = sosfilt(self.sos, samples, zi=self.zi)
+        return filtered
+
+    def reset(self):
+        self.zi = None
@@ -0,0 +1,190 @@
+import os
+import numpy as np
+import pytest
+from capture_file import CaptureFileWriter, CaptureFile, FLAG_RESYNC, FLAG_CORRUPT
+from exporters import StreamingWavWriter
+from frame_decoder import FrameDecoder
+from frame_check import FrameChecker, xor_checksum
+from capture import CaptureController
+from sample_decode import decode_12bit
+from recording import Recording
+import recover
+
+#Created By: Team E14
+#Round trips through the .e14raw capture file, run with: python -m pytest
+
+PAYLOAD_SIZE = 512
+
+def payload_bytes(frames, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(frames, PAYLOAD_SIZE), dtype=np.uint8)
+
+class StreamSource():
+    # Stands in for the serial port, reading from bytes in memory
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        return len(self.data) - self.position
+
+    def read(self, size=1):
+        self.position += size
+        return self.data[self.position - size:self.position]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "capture.e14raw")
+
+def test_whole_frames(path):
+    payloads = payload_bytes(10)
+    with CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=100.0) as writer:
+        writer.write(payloads, 1, 100.0 + np.arange(10) * 0.01)
+    capture = CaptureFile(path)
+    assert capture.complete
+    assert len(capture) == 10
+    assert capture.sample_count == 10 * PAYLOAD_SIZE // 2
+    assert np.array_equal(capture.payloads, payloads)
+    assert np.array_equal(capture.raw(), payloads.reshape(-1))
+    assert np.array_equal(capture.samples(), decode_12bit(payloads))
+    assert np.allclose(capture.arrival, np.arange(10) * 0.01)
+    assert np.all(capture.in_range == 1)
+
+def test_short_last_frame(path):
+    # A manual recording stops on an exact sample count, so its last frame is nearly always short.
+    # More than 65535 bytes are read back, past what the uint16 record length field can hold.
+    payloads = payload_bytes(200)
+    data = np.concatenate((payloads.reshape(-1), payload_bytes(1, seed=1)[0, :100]))
+    with CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=0) as writer:
+        writer.write(payloads, 1, 0.0)
+        writer.write(data[len(payloads.reshape(-1)):].tobytes(), 0, 1.0)
+    capture = CaptureFile(path)
+    assert len(capture) == 201
+    assert capture.sample_count == len(data) // 2
+    assert np.array_equal(capture.raw(), data)
+    assert np.array_equal(capture.raw(150), data[150 * PAYLOAD_SIZE:])
+    assert np.array_equal(capture.samples(), decode_12bit(data))
+    assert np.array_equal(np.concatenate(list(capture.chunks(64))), decode_12bit(data))
+
+    recording = Recording.open(path)
+    assert len(recording) == len(data) // 2
+    assert np.array_equal(recording[:], decode_12bit(data))
+    assert np.array_equal(recording[-60:], decode_12bit(data)[-60:])
+    assert np.array_equal(recording[::7], decode_12bit(data)[::7])
+    assert np.array_equal(recording[::-300], decode_12bit(data)[::-300])
+    assert recording.mean() == pytest.approx(decode_12bit(data).mean())
+
+def test_flags_and_index(path):
+    with CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=0, index_interval=1.0) as writer:
+        writer.write(payload_bytes(4), [1, 0, 1, 0], [0.0, 0.5, 1.5, 2.5], resync=[False, True, False, False], corrupt=[False, False, True, False])
+    capture = CaptureFile(path)
+    assert capture.in_range.tolist() == [1, 0, 1, 0]
+    assert list(capture.resyncs) == [1]
+    assert list(capture.corrupt) == [2]
+    assert capture.records["flags"].tolist() == [0, FLAG_RESYNC, FLAG_CORRUPT, 0]
+    assert [capture.frame_at_arrival(seconds) for seconds in (0.0, 1.0, 1.6, 2.0, 9.0)] == [0, 2, 3, 3, 4]
+
+def test_payload_size_change_stays_packed(path):
+    # 2 frames at 512 bytes, the board changes to 612 then back to 512: nothing is padded mid file
+    frames = [payload_bytes(2, seed=0), payload_bytes(1, seed=1), payload_bytes(1, seed=2)]
+    frames[1] = np.concatenate((frames[1], frames[1][:, :100]), axis=1)
+    with CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=0) as writer:
+        for i, payload in enumerate(frames):
+            writer.write(payload, 1, float(i))
+    data = np.concatenate([payload.reshape(-1) for payload in frames])
+    capture = CaptureFile(path)
+    assert capture.sample_count == len(data) // 2 == 1074
+    assert np.array_equal(capture.raw(), data)
+    assert capture.records["length"].tolist() == [512, 512, 512, 512, 100]
+
+def test_flat_runs_carry_over(path):
+    # flat runs of any length, e.g. a frame at a time of a 600 byte payload, read back unchanged
+    data = payload_bytes(12).reshape(-1)
+    runs = np.cumsum([0, 600, 600, 7, 1000, 1, 2000, 300])
+    with CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=0) as writer:
+        for i, (start, stop) in enumerate(zip(runs[:-1], runs[1:])):
+            writer.write(data[start:stop].tobytes(), i % 2, float(i), resync=i == 3, corrupt=i == 5)
+    capture = CaptureFile(path)
+    assert np.array_equal(capture.raw(), data[:runs[-1]])
+    assert np.all(capture.records["length"][:-1] == PAYLOAD_SIZE)
+    # each record starts in the run it takes in_range and arrival from
+    record_runs = np.searchsorted(runs, np.arange(len(capture)) * PAYLOAD_SIZE, "right") - 1
+    assert np.array_equal(capture.arrival, record_runs.astype(float))
+    assert np.array_equal(capture.in_range, record_runs % 2)
+    # run 3 starts at byte 1207 after a resync, and run 5 (bytes 2208 to 4208) is corrupt
+    assert list(capture.resyncs) == [2]
+    assert list(capture.corrupt) == [4, 5, 6, 7, 8]
+
+def test_recording_cut_short_keeps_flags_on_its_frames(path):
+    # A manual recording ends part way into its last frame, which here failed its check. Only the
+    # record holding that frame's bytes is marked corrupt, not the full record before it.
+    frames = np.zeros((11, 4 + PAYLOAD_SIZE), dtype=np.uint8)
+    frames[:, :2] = 0xFF
+    frames[:, 2] = 1
+    frames[:, 4:] = payload_bytes(11) & 0x0F #no 0xFF 0xFF inside the payloads
+    frames[:, 3] = xor_checksum(frames[:, 4:])
+    frames[9, 3] ^= 1
+    decoder = FrameDecoder(PAYLOAD_SIZE, checker=FrameChecker("xor", "flag"))
+    target_bytes = 9 * PAYLOAD_SIZE + 100
+    with CaptureFileWriter(path, target_bytes // 2, PAYLOAD_SIZE) as writer:
+        CaptureController(decoder, target_bytes // 2).record(StreamSource(frames.tobytes()), 1, writer.write)
+    capture = CaptureFile(path)
+    assert capture.records["length"].tolist() == [PAYLOAD_SIZE] * 9 + [100]
+    assert list(capture.corrupt) == [9]
+    assert np.array_equal(capture.raw(), frames[:, 4:].reshape(-1)[:target_bytes])
+
+def test_legacy_8bit(path):
+    data = payload_bytes(3).reshape(-1)[:1000]
+    with CaptureFileWriter(path, 5000, PAYLOAD_SIZE, start_time=0, bytes_per_sample=1) as writer:
+        writer.write(data.tobytes(), 0, 0.0)
+    recording = Recording.open(path)
+    assert recording.sample_rate == 5000
+    assert np.array_equal(recording[:], data)
+
+def test_interrupted_capture_is_recovered(path):
+    payloads = payload_bytes(50)
+    writer = CaptureFileWriter(path, 44100, PAYLOAD_SIZE, start_time=0, sync_frames=16)
+    writer.write(payloads[:40], 1, np.arange(40) * 0.01)
+    writer.write(payloads[40, :300].tobytes(), 1, 0.5) #short frame, held back until a record fills
+    writer.flush()
+    with open(path, "ab") as partial: #a record cut off part way by the crash
+        partial.write(bytes(100))
+
+    capture = CaptureFile(path)
+    assert not capture.complete
+    assert len(capture) == 40
+    assert recover.find_interrupted(os.path.dirname(path)) == [path]
+
+    outputs = recover.recover(path, formats=(".wav", ".csv"))
+    assert [os.path.splitext(output)[1] for output in outputs] == [".wav", ".csv"]
+    capture = CaptureFile(path)
+    assert capture.complete
+    assert np.array_equal(capture.payloads, payloads[:40])
+    assert recover.find_interrupted(os.path.dirname(path)) == []
+    writer.file.close()
+
+def test_interrupted_capture_is_not_overwritten(tmp_path):
+    # A crash, then recording again under the same fixed name: the crashed journal and its streamed .wav are kept
+    name = str(tmp_path / "E14_44_1ksps")
+    crashed = CaptureFileWriter(name + ".e14raw", 44100, PAYLOAD_SIZE, start_time=0)
+    crashed.write(payload_bytes(20), 1, 0.0)
+    crashed.flush()
+    wav = StreamingWavWriter(name + ".wav", 44100)
+    wav.write(np.arange(100))
+    wav.file.flush()
+
+    with pytest.raises(FileExistsError):
+        CaptureFileWriter(name + ".e14raw", 44100, PAYLOAD_SIZE)
+    moved = recover.set_aside(name)
+    assert moved.startswith(name + "_interrupted_")
+    assert not os.path.exists(name + ".e14raw") and not os.path.exists(name + ".wav")
+    assert recover.find_interrupted(str(tmp_path)) == [moved + ".e14raw"]
+    assert np.array_equal(CaptureFile(moved + ".e14raw").payloads, payload_bytes(20))
+
+    with CaptureFileWriter(name + ".e14raw", 44100, PAYLOAD_SIZE, start_time=0) as writer:
+        writer.write(payload_bytes(2), 1, 0.0)
+    assert recover.set_aside(name) is None #a complete recording is left to be replaced as before
+    with CaptureFileWriter(name + ".e14raw", 44100, PAYLOAD_SIZE, start_time=0) as writer:
+        writer.write(payload_bytes(2), 1, 0.0)
+    crashed.file.close()
+    wav.file.close()
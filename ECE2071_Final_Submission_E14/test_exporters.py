@@ -0,0 +1,41 @@
+import io
+import csv
+import numpy as np
+import pytest
+from exporters import format_csv_rows, StreamingCsvWriter
+
+#Created By: Team E14
+#Checks the block CSV formatting gives the same bytes as csv.writer, run with: python -m pytest
+
+def csv_writer_rows(start, values):
+    text = io.StringIO(newline="")
+    writer = csv.writer(text)
+    for i, value in enumerate(values):
+        writer.writerow([start + i, value])
+    return text.getvalue().encode()
+
+@pytest.mark.parametrize("start", [0, 1, 9995, 99990, 9999990, 123456789])
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(0).integers(0, 4096, 200), #12-bit samples
+    np.random.default_rng(1).integers(0, 256, 200).astype(np.uint8), #legacy 8-bit samples
+    np.array([0, 9, 10, 99, 100, 999, 1000, 9999]),
+    np.array([10000, 65535, 0, 123456]), #wider than the 4 digit fast path
+    np.array([-32768, -1, 0, 1, 32767]),
+])
+def test_format_csv_rows_matches_csv_writer(start, values):
+    assert format_csv_rows(start, values) == csv_writer_rows(start, values.tolist())
+
+def test_format_csv_rows_line_end():
+    assert format_csv_rows(8, np.array([7, 4095]), line_end=b"\n") == b"8,7\n9,4095\n"
+
+def test_format_csv_rows_floats():
+    values = np.array([0.5, -1.25])
+    assert format_csv_rows(0, values) == csv_writer_rows(0, values.tolist())
+
+def test_streaming_csv_writer_frame_at_a_time(tmp_path):
+    samples = np.random.default_rng(2).integers(0, 4096, 5000)
+    path = tmp_path / "export.csv"
+    with StreamingCsvWriter(str(path), chunk_rows=700) as writer:
+        for i in range(0, len(samples), 256):
+            writer.write(samples[i:i + 256])
+    assert path.read_bytes() == b"Sample Index,16-bit Value\r\n" + csv_writer_rows(0, samples.tolist())
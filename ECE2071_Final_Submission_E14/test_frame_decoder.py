@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from frame_decoder import FrameDecoder
+from frame_check import FrameChecker, xor_checksum
+
+#Created By: Team E14
+#Checks how the frame tracker finds, keeps and loses the frame alignment, run with: python -m pytest
+
+PAYLOAD_SIZE = 64
+FRAME_SIZE = PAYLOAD_SIZE + 4
+SYNC = b"\xff\xff"
+
+def frames(count, in_range=1, checked=False):
+    # The first 12-bit sample of frame i is i, so a decoded payload says which frame it was.
+    # 12-bit little endian samples never contain 0xFF 0xFF, so the only sync words are the real ones.
+    samples = (np.arange(count)[:, None] * 32 + np.arange(PAYLOAD_SIZE // 2)) % 4096
+    samples[:, 0] = np.arange(count)
+    stream = np.zeros((count, FRAME_SIZE), dtype=np.uint8)
+    stream[:, :2] = 0xFF
+    stream[:, 2] = in_range
+    stream[:, 4:] = samples.astype("<u2").view(np.uint8).reshape(count, PAYLOAD_SIZE)
+    if checked:
+        stream[:, 3] = xor_checksum(stream[:, 4:])
+    return stream
+
+def frame_numbers(payloads):
+    return payloads[:, 0].astype(int) | (payloads[:, 1].astype(int) << 8)
+
+def decode(stream, decoder=None, chunk=1000):
+    # Feeds the stream in chunks, then the next frame's sync word that confirms the last frame
+    decoder = decoder or FrameDecoder(PAYLOAD_SIZE)
+    data = bytes(stream) + SYNC
+    results = [decoder.feed(data[i:i + chunk]) for i in range(0, len(data), chunk)]
+    return decoder, np.concatenate([payloads for payloads, _ in results])
+
+def decode_with_details(stream, decoder, chunk=1000):
+    data = bytes(stream) + SYNC
+    payloads, resync = [], []
+    for i in range(0, len(data), chunk):
+        new_payloads, _ = decoder.feed(data[i:i + chunk])
+        payloads.append(new_payloads)
+        resync.append(decoder.last_resync)
+    return np.concatenate(payloads), np.concatenate(resync)
+
+@pytest.mark.parametrize("chunk", [1, 7, FRAME_SIZE, 1000])
+def test_clean_stream(chunk):
+    stream = frames(50)
+    decoder, payloads = decode(stream, chunk=chunk)
+    assert np.array_equal(payloads, stream[:, 4:])
+    assert decoder.resyncs == decoder.sync_misses == decoder.lock_losses == 0
+
+def test_last_frame_waits_for_next_sync_word():
+    decoder = FrameDecoder(PAYLOAD_SIZE)
+    payloads, _ = decoder.feed(frames(3).tobytes())
+    assert frame_numbers(payloads).tolist() == [0, 1]
+    payloads, _ = decoder.feed(SYNC)
+    assert frame_numbers(payloads).tolist() == [2]
+
+def test_false_sync_word_is_rejected():
+    # Starting mid stream on a 0xFF 0xFF inside a payload that is not followed by another a frame later
+    stream = frames(10)
+    stream[3, 20:22] = 0xFF
+    decoder, payloads = decode(stream.reshape(-1)[3 * FRAME_SIZE + 10:])
+    assert decoder.false_syncs == 1
+    assert frame_numbers(payloads).tolist() == list(range(4, 10))
+    assert decoder.resyncs == 1
+
+def test_damaged_sync_words_are_tolerated():
+    # Up to max_misses sync words in a row can be damaged without losing the alignment, only those frames are dropped
+    stream = frames(30)
+    stream[5, 0] = 0
+    stream[10:10 + 3, 1] = 0
+    decoder = FrameDecoder(PAYLOAD_SIZE)
+    payloads, resync = decode_with_details(stream, decoder)
+    assert frame_numbers(payloads).tolist() == [i for i in range(30) if i not in (5, 10, 11, 12)]
+    assert decoder.sync_misses == 4
+    assert decoder.lock_losses == 0
+    assert frame_numbers(payloads[resync]).tolist() == [6, 13]
+
+def test_lock_is_lost_after_max_misses():
+    # Nothing confirms where frame 9 ends either, so it goes too and the stream is searched again
+    stream = frames(30)
+    stream[10:10 + 4, 0] = 0
+    decoder, payloads = decode(stream)
+    assert decoder.lock_losses == 1
+    assert decoder.resyncs == 1
+    assert frame_numbers(payloads).tolist() == list(range(9)) + list(range(14, 30))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_lost_bytes_never_reach_the_output(seed):
+    # Bursts of bytes lost inside payloads: the short frame holds the next frame's header, so it is dropped,
+    # and every frame that is returned is one that was sent, whole
+    rng = np.random.default_rng(seed)
+    stream = frames(500)
+    hit = np.sort(rng.choice(np.arange(1, 499), 20, replace=False))
+    keep = np.ones(stream.shape, dtype=bool)
+    for frame, start, length in zip(hit, rng.integers(4, PAYLOAD_SIZE - 8, 20), rng.integers(1, 8, 20)):
+        keep[frame, start:start + length] = False
+    decoder, payloads = decode(stream[keep])
+    numbers = frame_numbers(payloads)
+    assert np.array_equal(payloads, stream[numbers, 4:])
+    assert not np.isin(numbers, hit).any()
+    assert len(payloads) == 500 - 20
+    assert 0 < decoder.lock_losses <= 20 #one per burst, fewer when bursts hit neighbouring frames
+
+def test_resync_follows_frames_the_checker_drops():
+    # A frame dropped for failing its check leaves a gap, so the frame after it is marked as a resync,
+    # including when the dropped frame was the last one of a feed call
+    stream = frames(20, checked=True)
+    stream[[4, 9], 10] ^= 1
+    decoder = FrameDecoder(PAYLOAD_SIZE, checker=FrameChecker("xor", "drop"))
+    payloads, resync = decode_with_details(stream, decoder, chunk=10 * FRAME_SIZE + 2)
+    assert frame_numbers(payloads).tolist() == [i for i in range(20) if i not in (4, 9)]
+    assert frame_numbers(payloads[resync]).tolist() == [5, 10]
+    assert decoder.checker.frames_corrupt == 2
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from protocol_probe import classify, FRAMED, LEGACY
+from virtual_device import VirtualSTM32
+
+#Created By: Team E14
+#Checks the protocol probe on the streams each firmware sends, run with: python -m pytest
+
+PROBE_WINDOW = 8192
+
+def framed_window(device, frames=20):
+    # What the probe reads: a window starting part way through a frame
+    return device.frames(frames)[100:100 + PROBE_WINDOW]
+
+def idle_frames(frames, value=b"\x00\x08"):
+    # Old firmware with the ADC sat at a constant level: the pad byte is 0 and every payload is the same
+    frame = b"\xff\xff\x01\x00" + value * (FRAMED.payload_size // 2)
+    return frame * frames
+
+@pytest.mark.parametrize("checksum", [None, "xor", "crc8"])
+def test_framed_check_bytes(checksum):
+    result = classify(framed_window(VirtualSTM32(checksum=checksum, noise=2, seed=0)), 90000, FRAMED.baud_rate)
+    assert result.protocol.name == FRAMED.name
+    assert result.protocol.payload_size == 512
+    assert result.protocol.checksum == checksum
+
+@pytest.mark.parametrize("value", [b"\x00\x08", b"\x00\x00", b"\xff\x0f"])
+def test_idle_old_firmware_is_not_checked(value):
+    # A flat payload has an XOR (and for all zeros a CRC-8) of 0, the same as the unused pad byte
+    result = classify(idle_frames(20, value), 90000, FRAMED.baud_rate)
+    assert result.protocol.name == FRAMED.name
+    assert result.protocol.checksum is None
+
+def test_too_few_checked_frames():
+    # Frames that do carry check bytes, but too few of them differ to tell from chance
+    device = VirtualSTM32(checksum="xor", noise=2, seed=0)
+    data = device.frames(3) + idle_frames(17)
+    assert classify(data, 90000, FRAMED.baud_rate).protocol.checksum is None
+
+def test_legacy_stream():
+    device = VirtualSTM32(protocol="legacy", noise=2, seed=0)
+    data = device.samples(PROBE_WINDOW).astype(np.uint8).tobytes()
+    result = classify(data, 5000, LEGACY.baud_rate)
+    assert result.protocol.name == LEGACY.name
+    assert result.protocol.checksum is None
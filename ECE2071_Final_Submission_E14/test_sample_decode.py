@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sample_decode import decode_12bit, decode_8bit, decode_samples, SampleDecoder
+
+#Created By: Team E14
+#Checks the vectorised sample decoding against the original per sample loop, run with: python -m pytest
+
+def loop_decode_12bit(data):
+    # The original per sample loop from Menu.__process_raw_data
+    data = np.array(data, dtype=np.uint8)
+    samples = []
+    for i in range(0, len(data), 2):
+        lsb = int(data[i])
+        msb = int(data[i+1])
+        sample = ((msb & 0x0F) << 8) | lsb
+        samples.append(sample)
+    return np.array(samples)
+
+@pytest.fixture
+def raw():
+    #random bytes, so the upper nibble of each MSB is not zero filled
+    return np.random.default_rng(1).integers(0, 256, size=20000, dtype=np.uint8)
+
+def test_decode_12bit_matches_loop(raw):
+    assert np.array_equal(decode_12bit(raw), loop_decode_12bit(raw))
+
+def test_decode_12bit_accepts_bytes(raw):
+    assert np.array_equal(decode_12bit(raw.tobytes()), decode_12bit(raw))
+    assert np.array_equal(decode_12bit(bytearray(raw.tobytes())), decode_12bit(raw))
+
+def test_decode_12bit_keeps_lower_12_bits():
+    samples = decode_12bit(bytes([0xFF, 0xFF, 0x34, 0x12, 0x00, 0x00]))
+    assert samples.tolist() == [0x0FFF, 0x0234, 0]
+
+def test_decode_12bit_drops_odd_trailing_byte(raw):
+    assert np.array_equal(decode_12bit(raw[:-1]), loop_decode_12bit(raw[:-2]))
+
+def test_decode_12bit_unaligned_slice(raw):
+    #a slice starting on an odd byte is not aligned for a uint16 view
+    assert np.array_equal(decode_12bit(raw[1:-1]), loop_decode_12bit(raw[1:-1]))
+
+def test_decode_8bit_and_decode_samples(raw):
+    assert np.array_equal(decode_8bit(raw.tobytes()), raw)
+    assert np.array_equal(decode_samples(raw, 1), raw)
+    assert np.array_equal(decode_samples(raw, 2), decode_12bit(raw))
+
+@pytest.mark.parametrize("frame_size", [1, 3, 511, 512, 513, 1025])
+def test_sample_decoder_across_frames(raw, frame_size):
+    #odd frame sizes split a sample's LSB and MSB across two frames
+    decoder = SampleDecoder()
+    chunks = [decoder.decode(raw[i:i + frame_size]) for i in range(0, len(raw), frame_size)]
+    assert np.array_equal(np.concatenate(chunks), loop_decode_12bit(raw))
+
+def test_sample_decoder_mixed_frame_sizes(raw):
+    decoder = SampleDecoder()
+    bounds = np.cumsum(np.random.default_rng(2).integers(0, 40, size=len(raw)))
+    bounds = np.concatenate(([0], bounds[bounds < len(raw)], [len(raw)]))
+    chunks = [decoder.decode(raw[start:stop].tobytes()) for start, stop in zip(bounds[:-1], bounds[1:])]
+    assert np.array_equal(np.concatenate(chunks), loop_decode_12bit(raw))
+
+def test_sample_decoder_reset_drops_split_byte(raw):
+    decoder = SampleDecoder()
+    decoder.decode(raw[:3])
+    decoder.reset()
+    assert np.array_equal(decoder.decode(raw[4:10]), loop_decode_12bit(raw[4:10]))
+
+def test_sample_decoder_8bit(raw):
+    decoder = SampleDecoder(bytes_per_sample=1)
+    assert np.array_equal(np.concatenate([decoder.decode(raw[i:i + 7]) for i in range(0, len(raw), 7)]), raw)
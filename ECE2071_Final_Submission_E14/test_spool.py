@@ -0,0 +1,95 @@
+import os
+import gc
+import numpy as np
+import pytest
+from spool import SpoolBuffer
+from recording import get_items
+
+#Created By: Team E14
+#Checks the on disk recording buffers read back what was appended, run with: python -m pytest
+
+SEGMENT_SIZE = 1000 #bytes, small so a few appends span several segments
+
+@pytest.fixture
+def data():
+    return np.random.default_rng(0).integers(0, 256, size=5500, dtype=np.uint8)
+
+def spooled(data, tmp_path, dtype=np.uint8, append_size=300):
+    spool = SpoolBuffer(SEGMENT_SIZE, dtype, folder=str(tmp_path))
+    for start in range(0, len(data), append_size):
+        spool.append(data[start:start + append_size])
+    return spool
+
+def test_rolls_over_to_new_segments(data, tmp_path):
+    spool = spooled(data, tmp_path)
+    assert len(spool) == len(data)
+    assert spool.lengths == [1000] * 5 + [500]
+    assert len(os.listdir(spool.files.folder)) == 6
+    assert np.array_equal(np.asarray(spool.view()), data)
+
+def test_bytes_and_one_append_spanning_segments(data, tmp_path):
+    spool = SpoolBuffer(SEGMENT_SIZE, folder=str(tmp_path))
+    spool.append(data[:10].tobytes())
+    spool.append(data[10:])
+    assert np.array_equal(np.asarray(spool.view()), data)
+
+def test_reads_spanning_segments(data, tmp_path):
+    view = spooled(data, tmp_path).view()
+    for index in (slice(990, 1010), slice(500, 4500), slice(0, len(data)), slice(2000, 3000), slice(-20, None), slice(4000, 9000)):
+        assert np.array_equal(view[index], data[index])
+    assert view[999] == data[999] and view[1000] == data[1000] and view[-1] == data[-1]
+    assert np.array_equal(np.concatenate(list(view.chunks(700))), data)
+    with pytest.raises(IndexError):
+        view[len(data)]
+
+@pytest.mark.parametrize("index", [slice(None, None, 7), slice(None, None, -3), slice(5000, 100, -250), slice(1, None, 2000), slice(3, 4, 10)])
+def test_strided_reads(data, tmp_path, index):
+    assert np.array_equal(spooled(data, tmp_path).view()[index], data[index])
+
+def test_strided_slices_read_in_chunks():
+    # rec[::1000] of a long recording reads a chunk at a time rather than everything it steps over
+    reads = []
+    def read(start, stop):
+        reads.append(stop - start)
+        return np.arange(start, stop)
+    length = 10 ** 7
+    assert np.array_equal(get_items(slice(None, None, 1000), length, read, np.int64, chunk_items=1 << 16), np.arange(0, length, 1000))
+    assert max(reads) <= 1 << 16
+    assert np.array_equal(get_items(slice(None, 10, -3), length, read, np.int64, chunk_items=1 << 16), np.arange(length - 1, 10, -3))
+    assert np.array_equal(get_items(slice(None, None, 1 << 20), length, read, np.int64, chunk_items=1 << 16), np.arange(0, length, 1 << 20))
+    assert max(reads) <= 1 << 16
+
+def test_float_items(tmp_path):
+    samples = np.random.default_rng(1).normal(size=700).astype(np.float32)
+    view = spooled(samples, tmp_path, np.float32, append_size=64).view()
+    assert view.lengths == [250, 250, 200]
+    assert np.array_equal(view[240:260], samples[240:260])
+    assert np.array_equal(np.asarray(view), samples)
+
+def test_empty_view(tmp_path):
+    view = SpoolBuffer(SEGMENT_SIZE, folder=str(tmp_path)).view()
+    assert len(view) == 0 and view.shape == (0,)
+    assert len(np.asarray(view)) == 0
+    assert len(view[:]) == 0
+    assert list(view.chunks()) == []
+
+def test_view_is_a_snapshot(data, tmp_path):
+    spool = spooled(data[:1500], tmp_path)
+    view = spool.view()
+    spool.append(data[1500:])
+    assert len(view) == 1500
+    assert np.array_equal(np.asarray(view), data[:1500])
+
+def test_folder_removed_once_unused(data, tmp_path):
+    # The export worker can still be reading a view after the menu has cleared the buffer for the next recording
+    spool = spooled(data, tmp_path)
+    folder = spool.files.folder
+    view = spool.view()
+    spool.clear()
+    gc.collect()
+    assert os.path.isdir(folder)
+    assert np.array_equal(np.asarray(view), data)
+    del view
+    gc.collect()
+    assert not os.path.exists(folder)
+    assert os.listdir(tmp_path) == []
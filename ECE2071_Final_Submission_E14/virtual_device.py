@@ -0,0 +1,216 @@
+import os
+import pty
+import sys
+import tty
+import time
+import runpy
+import argparse
+import threading
+import numpy as np
+import serial
+from frame_check import xor_checksum, crc8
+import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+#Created By: Team E14
+#Simulated sampler/processor pair on a Linux pseudo-terminal, for testing the host without hardware
+#Run a script against it with: python virtual_device.py [options] audio_interface_final.py
+
+class VirtualSTM32():
+    # Streams the same bytes the processor firmware sends:
+    #   "framed": 0xFF 0xFF | in_range | pad | payload_size bytes of 12-bit little endian samples (44.1 kHz)
+    #   "legacy": unframed 8-bit samples (the 5 kHz MVP stream)
+    # in_range_pattern is a list that is cycled frame by frame, or a function of the frame number.
+    # checksum "xor" or "crc8" puts a check byte in the pad byte, as firmware with frame checks would.
+    def __init__(self, protocol="framed", sample_rate=None, baud_rate=None, payload_size=512, in_range_pattern=(1,),
+                 tone_hz=440, noise=0.0, drop_rate=0.0, false_sync_rate=0.0, realtime=True, seed=None,
+                 checksum=None, corrupt_rate=0.0):
+        self.protocol = protocol
+        self.sample_rate = sample_rate or (44100 if protocol == "framed" else 5000)
+        self.baud_rate = baud_rate or (921600 if protocol == "framed" else 115200)
+        self.payload_size = payload_size
+        self.in_range_pattern = in_range_pattern
+        self.tone_hz = tone_hz
+        self.noise = noise #standard deviation of added noise, in ADC counts
+        self.drop_rate = drop_rate #chance of each byte being lost on the wire
+        self.false_sync_rate = false_sync_rate #chance of a frame carrying a 0xFF 0xFF inside its payload
+        self.checksum = checksum
+        self.corrupt_rate = corrupt_rate #chance of each frame having one payload bit flipped on the wire
+        self.realtime = realtime #False sends as fast as the host reads
+        self.rng = np.random.default_rng(seed)
+
+        self.samples_sent = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.running = False
+        self.thread = None
+        self.port = None
+        self.__master = None
+        self.__slave = None
+
+    def start(self):
+        self.__master, self.__slave = pty.openpty()
+        tty.setraw(self.__slave)
+        self.port = os.ttyname(self.__slave)
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        for fd in (self.__master, self.__slave):
+            if fd is not None:
+                os.close(fd)
+        self.__master = None
+        self.__slave = None
+
+    def unplug(self, seconds):
+        # Like pulling the USB cable for a while: the port disappears, then comes back (under a new pty name)
+        self.stop()
+        time.sleep(seconds)
+        return self.start()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def in_range(self, frame):
+        if callable(self.in_range_pattern):
+            return int(self.in_range_pattern(frame))
+        return int(self.in_range_pattern[frame % len(self.in_range_pattern)])
+
+    def samples(self, count):
+        # A tone plus optional noise, continuing from the last sample sent
+        t = (self.samples_sent + np.arange(count)) / self.sample_rate
+        full_scale = 4096 if self.protocol == "framed" else 256
+        signal = full_scale / 2 + full_scale / 3 * np.sin(2 * np.pi * self.tone_hz * t)
+        if self.noise != 0:
+            signal += self.rng.normal(0, self.noise, count)
+        self.samples_sent += count
+        return np.clip(np.round(signal), 0, full_scale - 1).astype(np.uint16)
+
+    def frames(self, count):
+        samples_per_frame = self.payload_size // 2
+        samples = self.samples(count * samples_per_frame).astype("<u2").view(np.uint8).reshape(count, self.payload_size)
+        frames = np.zeros((count, 4 + self.payload_size), dtype=np.uint8)
+        frames[:, 0] = 0xFF
+        frames[:, 1] = 0xFF
+        frames[:, 2] = [self.in_range(self.frames_sent + i) for i in range(count)]
+        frames[:, 4:] = samples
+        if self.false_sync_rate != 0:
+            hits = np.flatnonzero(self.rng.random(count) < self.false_sync_rate)
+            offsets = 4 + 2 * self.rng.integers(0, samples_per_frame - 1, len(hits))
+            frames[hits, offsets] = 0xFF
+            frames[hits, offsets + 1] = 0xFF
+        if self.checksum == "xor":
+            frames[:, 3] = xor_checksum(frames[:, 4:])
+        elif self.checksum == "crc8":
+            frames[:, 3] = crc8(frames[:, 4:])
+        if self.corrupt_rate != 0:
+            hits = np.flatnonzero(self.rng.random(count) < self.corrupt_rate)
+            offsets = 4 + self.rng.integers(0, self.payload_size, len(hits))
+            frames[hits, offsets] ^= (1 << self.rng.integers(0, 8, len(hits))).astype(np.uint8)
+        self.frames_sent += count
+        return frames.tobytes()
+
+    def __next_block(self, samples):
+        if self.protocol == "framed":
+            data = self.frames(max(1, samples // (self.payload_size // 2)))
+        else:
+            data = self.samples(samples).astype(np.uint8).tobytes()
+        if self.drop_rate != 0:
+            data = np.frombuffer(data, dtype=np.uint8)
+            data = data[self.rng.random(len(data)) >= self.drop_rate].tobytes()
+        return data
+
+    def __run(self):
+        # Bytes per second is limited by whichever is slower, the sample rate or the UART (10 bits per byte)
+        bytes_per_sample = (4 + self.payload_size) / (self.payload_size / 2) if self.protocol == "framed" else 1
+        sample_rate = min(self.sample_rate, self.baud_rate / 10 / bytes_per_sample)
+        start = time.perf_counter() - self.samples_sent / sample_rate #carry on from where a restart left off
+        due = 0
+        try:
+            while self.running:
+                if self.realtime:
+                    time.sleep(0.005)
+                    due = int((time.perf_counter() - start) * sample_rate) - self.samples_sent
+                    if due > sample_rate * 0.1: #nobody was reading, the firmware would have dropped these
+                        self.samples_sent += due - int(sample_rate * 0.1)
+                        due = int(sample_rate * 0.1)
+                    if self.protocol == "framed" and due < self.payload_size // 2:
+                        continue
+                    if due <= 0:
+                        continue
+                else:
+                    due = 64 * (self.payload_size // 2)
+                data = self.__next_block(due)
+                os.write(self.__master, data)
+                self.bytes_sent += len(data)
+        except OSError:
+            pass #pty closed
+
+def attach(device, description="STM32 STLink Virtual COM Port"):
+    # Makes serial port discovery and serial.Serial open the virtual device, whatever port name a script asks for
+    open_serial = serial.Serial
+
+    def open_virtual(port=None, *args, **kwargs):
+        return open_serial(device.port, *args, **kwargs)
+
+    def comports(*args, **kwargs):
+        info = ListPortInfo(device.port, skip_link_detection=True)
+        info.description = description
+        return [info]
+
+    serial.Serial = open_virtual
+    serial.tools.list_ports.comports = comports
+
+def parse_pattern(text):
+    # "1" or "0,0,0,1,1" -> list of in_range flags, "200x0,500x1" -> 200 zeros then 500 ones
+    pattern = []
+    for part in text.split(","):
+        count, _, value = part.rpartition("x")
+        pattern += [int(value)] * int(count or 1)
+    return pattern
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a capture script against a simulated STM32")
+    parser.add_argument("script", nargs="?", help="script to run, omit to just print the pty path")
+    parser.add_argument("--protocol", choices=["framed", "legacy"], default="framed")
+    parser.add_argument("--sample-rate", type=int)
+    parser.add_argument("--baud", type=int)
+    parser.add_argument("--payload", type=int, default=512)
+    parser.add_argument("--in-range", default="1", help='in_range pattern, e.g. "200x0,500x1"')
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--false-sync-rate", type=float, default=0.0)
+    parser.add_argument("--checksum", choices=["xor", "crc8"], help="send a check byte in each frame header")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--fast", action="store_true", help="send as fast as the host reads instead of in real time")
+    args, script_args = parser.parse_known_args()
+
+    device = VirtualSTM32(args.protocol, args.sample_rate, args.baud, args.payload, parse_pattern(args.in_range),
+                          noise=args.noise, drop_rate=args.drop_rate, false_sync_rate=args.false_sync_rate, realtime=not args.fast,
+                          checksum=args.checksum, corrupt_rate=args.corrupt_rate)
+    device.start()
+    print(f"Virtual STM32 on {device.port}")
+
+    if args.script is None:
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    else:
+        attach(device)
+        sys.argv = [args.script] + script_args
+        sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+        try:
+            runpy.run_path(args.script, run_name="__main__")
+        finally:
+            device.stop()
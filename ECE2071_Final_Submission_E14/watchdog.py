@@ -0,0 +1,100 @@
+import time
+import threading
+
+#Created By: Team E14
+#Notices when the sampler stops sending, so a stalled board cannot hang a capture forever
+
+class Stall():
+    # One period without any valid frames, from the last frame before it until frames came back
+    def __init__(self, started, frames):
+        self.started = started #time.monotonic() of the last frame before the stall
+        self.frames = frames #frames decoded before the stall
+        self.ended = None
+        self.reported = False #check() has raised for this stall
+
+    @property
+    def duration(self):
+        return (time.monotonic() if self.ended is None else self.ended) - self.started
+
+class SamplerStalled(Exception):
+    # Raised by StallWatchdog.check() in the capture loop
+    def __init__(self, stall):
+        super().__init__(f"no frames from the sampler for {stall.duration:.1f} s")
+        self.stall = stall
+
+class StallWatchdog():
+    # Watches a frame counter from its own thread, so the capture loop does nothing extra per read.
+    # progress() is read every poll_interval and when it has not moved for deadline seconds a Stall
+    # starts and on_stall(stall) is called from the watchdog thread, for example to wake a blocked read.
+    # The capture loop calls check() when a read comes back empty, which raises SamplerStalled once per stall.
+    def __init__(self, progress, deadline=2.0, on_stall=None, poll_interval=None):
+        self.progress = progress #e.g. lambda: decoder.frames_decoded
+        self.deadline = deadline
+        self.on_stall = on_stall
+        self.poll_interval = poll_interval or deadline / 4
+
+        self.stalls = [] #every stall seen, for the duration metrics
+        self.stall = None #the stall going on now
+        self.__last_count = None
+        self.__last_progress = 0
+        self.__stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop() #in case it was left running
+        self.__last_count = self.progress()
+        self.__last_progress = time.monotonic()
+        self.stall = None
+        self.__stop.clear()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.__stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.stall is not None:
+            self.stall.ended = time.monotonic()
+            self.stall = None
+
+    def __run(self):
+        while not self.__stop.wait(self.poll_interval):
+            count = self.progress()
+            now = time.monotonic()
+            if count != self.__last_count:
+                self.__last_count = count
+                self.__last_progress = now
+                if self.stall is not None: #frames are back
+                    self.stall.ended = now
+                    self.stall = None
+            elif self.stall is None and now - self.__last_progress >= self.deadline:
+                self.stall = Stall(self.__last_progress, count)
+                self.stalls.append(self.stall)
+                if self.on_stall is not None:
+                    self.on_stall(self.stall)
+
+    def check(self):
+        stall = self.stall
+        if stall is not None and not stall.reported:
+            stall.reported = True
+            raise SamplerStalled(stall)
+
+    @property
+    def seconds_since_progress(self):
+        return time.monotonic() - self.__last_progress
+
+    @property
+    def total_stall_time(self):
+        return sum(stall.duration for stall in self.stalls)
+
+    @property
+    def longest_stall(self):
+        return max((stall.duration for stall in self.stalls), default=0.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
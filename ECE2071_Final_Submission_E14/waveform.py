@@ -0,0 +1,104 @@
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+#Created By: Team E14
+#Waveform plots that only draw as many points as the image has pixel columns
+
+class WaveformEnvelope():
+    # Keeps a min/max envelope of a signal in at most 2*columns bins while samples stream in.
+    # Whenever there are too many bins, neighbouring bins are merged and the bin size doubles,
+    # so memory and render time stay the same no matter how long the recording is.
+    def __init__(self, columns=1200):
+        self.columns = columns
+        self.bin_size = 1
+        self.count = 0
+        self.starts = np.empty(0, dtype=np.int64) #first sample index of each bin
+        self.mins = np.empty(0)
+        self.maxs = np.empty(0)
+        self.__partial_count = 0 #samples in the unfinished bin, kept as a running min/max
+        self.__partial_min = np.inf
+        self.__partial_max = -np.inf
+
+    def update(self, samples):
+        samples = np.asarray(samples)
+        if len(samples) == 0:
+            return
+        # finish the bin left open by the last update
+        if self.__partial_count != 0:
+            head = samples[:self.bin_size - self.__partial_count]
+            samples = samples[len(head):]
+            self.__partial_min = min(self.__partial_min, head.min())
+            self.__partial_max = max(self.__partial_max, head.max())
+            self.__partial_count += len(head)
+            self.count += len(head)
+            if self.__partial_count == self.bin_size:
+                self.__append(np.array([self.count - self.bin_size]), np.array([self.__partial_min]), np.array([self.__partial_max]))
+                self.__partial_count = 0
+
+        full = len(samples) - len(samples) % self.bin_size
+        if full != 0:
+            blocks = samples[:full].reshape(-1, self.bin_size)
+            self.__append(self.count + np.arange(len(blocks)) * self.bin_size, blocks.min(axis=1), blocks.max(axis=1))
+            self.count += full
+
+        tail = samples[full:]
+        if len(tail) != 0:
+            self.__partial_min = tail.min()
+            self.__partial_max = tail.max()
+            self.__partial_count = len(tail)
+            self.count += len(tail)
+
+    def envelope(self):
+        # Returns (starts, mins, maxs), between columns and 2*columns bins once the signal is long enough
+        starts, mins, maxs = self.starts, self.mins, self.maxs
+        if self.__partial_count != 0:
+            starts = np.append(starts, self.count - self.__partial_count)
+            mins = np.append(mins, self.__partial_min)
+            maxs = np.append(maxs, self.__partial_max)
+        return starts, mins, maxs
+
+    def __append(self, starts, mins, maxs):
+        self.starts = np.concatenate((self.starts, starts))
+        self.mins = np.concatenate((self.mins, mins))
+        self.maxs = np.concatenate((self.maxs, maxs))
+        while len(self.mins) > 2 * self.columns:
+            self.starts, self.mins, self.maxs = self.__merge(self.starts, self.mins, self.maxs)
+            self.bin_size *= 2
+
+    def __merge(self, starts, mins, maxs):
+        # pairs up neighbouring bins, an odd last bin is kept as it is
+        even = len(mins) - len(mins) % 2
+        return (np.concatenate((starts[0:even:2], starts[even:])),
+                np.concatenate((np.minimum(mins[0:even:2], mins[1:even:2]), mins[even:])),
+                np.concatenate((np.maximum(maxs[0:even:2], maxs[1:even:2]), maxs[even:])))
+
+def minmax_envelope(data, columns=1200, chunk_size=1024*1024):
+    envelope = WaveformEnvelope(columns)
+    for i in range(0, len(data), chunk_size):
+        envelope.update(data[i:i + chunk_size])
+    return envelope
+
+def save_waveform(path, data, sample_rate, title="Filtered ADC Waveform (16-bit Depth)", ylabel="Amplitude (16-bit)", figsize=(12, 4), dpi=100):
+    # data can be the samples themselves or a WaveformEnvelope that was filled during capture
+    envelope = data if isinstance(data, WaveformEnvelope) else minmax_envelope(data, int(figsize[0] * dpi))
+    starts, mins, maxs = envelope.envelope()
+
+    # draw each bin as a vertical stroke from its min to its max
+    time_axis = np.repeat(starts / sample_rate, 2)
+    values = np.empty(2 * len(mins))
+    values[0::2] = mins
+    values[1::2] = maxs
+
+    # a Figure on an Agg canvas rather than pyplot, which is not thread safe and would start the
+    # GUI backend (TkAgg on Windows) from the export worker thread
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.plot(time_axis, values, color='blue')
+    axes.set_title(title)
+    axes.set_xlabel("Time (s)")
+    axes.set_ylabel(ylabel)
+    axes.grid(True)
+    figure.tight_layout()
+    figure.savefig(path)
@@ -4,7 +4,10 @@ import wave
 import serial
 import matplotlib.pyplot as plt
 import time
-import csv
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ECE2071_Final_Submission_E14"))
+from exporters import StreamingCsvWriter # same block CSV writer as the final submission
 from scipy.signal import butter, filtfilt
 
 
@@ -48,21 +51,12 @@ print(f"Collected {len(data)} data in {duration:.2f} seconds.")
 data = np.array(data, dtype=np.uint8)
 
 # Reconstruct 12-bit values from the 16-bit chunks (LSB + MSB)
-samples = []
-for i in range(0, len(data), 2):  # Process two bytes (16 bits) per sample
-    lsb = int(data[i])
-    msb = int(data[i+1])
-    # Combine the LSB and MSB to get a 12-bit sample (only lower 12 bits)
-    sample = ((msb & 0x0F) << 8) | lsb  # The 4 MSB bits are discarded
-    samples.append(sample)
-samples = np.array(samples)
+# The bytes are already little endian uint16 samples, so keep the lower 12 bits of each
+samples = data[:len(data) - len(data) % 2].view("<u2") & 0x0FFF  # The 4 MSB bits are discarded
 
 # Save original 16-bit values to CSV (before scaling)
-with open("raw_16bit_values.csv", mode='w', newline='') as csv_file:
-    writer = csv.writer(csv_file)
-    writer.writerow(["Sample Index", "16-bit Value"])
-    for i, sample in enumerate(samples):
-        writer.writerow([i, sample])
+with StreamingCsvWriter("raw_16bit_values.csv", header=("Sample Index", "16-bit Value")) as csv_writer:
+    csv_writer.write(samples)
 print("Saved: raw_16bit_values.csv")
 
 # Normalize for audio and convert to 16-bit (for saving as 16-bit WAV file)
@@ -13,11 +13,12 @@ PORT           = 'COM12'     # ← your Processing STM port
 BAUD_RATE      = 115200
 OUTPUT_WAV_FULL = 'audio_recording_10s.wav'
 OUTPUT_WAV_REDUCED = 'audio_recording_5s.wav'
+STALL_SECONDS  = 2           # stop early if the STM sends nothing for this long
 # ————————————————————
 
 def record_and_process():
-    # 1) Open port in blocking mode
-    ser = serial.Serial(PORT, BAUD_RATE, timeout=None)
+    # 1) Open port, reads give up after a second so a stalled STM cannot hang the loop
+    ser = serial.Serial(PORT, BAUD_RATE, timeout=1.0)
     print(f"Opened {PORT} @ {BAUD_RATE}. Target: {RECORD_SECONDS_LONG} seconds at {SAMPLE_RATE} Hz")
     
     # 2) Flush any old data
@@ -25,6 +26,7 @@ def record_and_process():
     
     # 3) Record with timing
     start_time = time.time()
+    last_data_time = start_time
     
     # Read data in chunks to ensure we get exactly 10 seconds
     data = bytearray()
@@ -40,6 +42,10 @@ def record_and_process():
         chunk = ser.read(min(remaining, 1000))
         if chunk:
             data.extend(chunk)
+            last_data_time = time.time()
+        elif time.time() - last_data_time >= STALL_SECONDS:
+            print(f"No data from the STM for {STALL_SECONDS} seconds, stopping early")
+            break
     
     end_time = time.time()
     elapsed = end_time - start_time
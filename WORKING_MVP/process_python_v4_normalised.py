@@ -9,17 +9,18 @@ NUM_SAMPLES    = SAMPLE_RATE * RECORD_SECONDS
 PORT           = 'COM3'      # ← your Processing STM port
 BAUD_RATE      = 115200
 OUTPUT_WAV     = 'audio_recording_normalized.wav'
+STALL_SECONDS  = 2           # give up if the STM sends nothing for this long
 # ————————————————————
 
 def record_and_save():
-    # 1) Open port in blocking mode
-    ser = serial.Serial(PORT, BAUD_RATE, timeout=None)
+    # 1) Open port in blocking mode, but never wait forever on a stalled STM
+    ser = serial.Serial(PORT, BAUD_RATE, timeout=RECORD_SECONDS + STALL_SECONDS, inter_byte_timeout=STALL_SECONDS)
     print(f"Opened {PORT} @ {BAUD_RATE}. Reading next {NUM_SAMPLES} samples…")
 
     # 2) Flush any old data
     ser.reset_input_buffer()
 
-    # 3) Block until we get exactly NUM_SAMPLES bytes
+    # 3) Block until we get exactly NUM_SAMPLES bytes (or the STM stops sending)
     data = ser.read(NUM_SAMPLES)
     ser.close()
 
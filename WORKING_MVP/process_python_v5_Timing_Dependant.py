@@ -10,11 +10,12 @@ NUM_SAMPLES    = SAMPLE_RATE * RECORD_SECONDS
 PORT           = 'COM3'     # ← your Processing STM port
 BAUD_RATE      = 115200
 OUTPUT_WAV     = 'audio_recording.wav'
+CHUNK_SECONDS  = 0.01        # longest a read waits, sets how close to RECORD_SECONDS we stop
 # ————————————————————
 
 def record_and_save():
-    # 1) Open port with a short timeout so we can poll
-    ser = serial.Serial(PORT, BAUD_RATE, timeout=0.1)
+    # 1) Open port with a short timeout, read() sleeps until bytes arrive instead of us polling in_waiting
+    ser = serial.Serial(PORT, BAUD_RATE, timeout=CHUNK_SECONDS)
     print(f"Opened {PORT} @ {BAUD_RATE}, recording for {RECORD_SECONDS}s…")
     ser.reset_input_buffer()
 
@@ -22,11 +23,11 @@ def record_and_save():
     start = time.time()
 
     # 2) Read continuously until 5s elapsed or buffer full
+    #    each read asks for whatever is queued, or about CHUNK_SECONDS worth when nothing is
     while (time.time() - start) < RECORD_SECONDS and len(data) < NUM_SAMPLES:
-        to_read = ser.in_waiting
-        if to_read:
-            chunk = ser.read(min(to_read, NUM_SAMPLES - len(data)))
-            data.extend(chunk)
+        to_read = max(ser.in_waiting, int(SAMPLE_RATE * CHUNK_SECONDS))
+        chunk = ser.read(min(to_read, NUM_SAMPLES - len(data)))
+        data.extend(chunk)
 
     # 3) One final non-blocking byte, if available
     if len(data) < NUM_SAMPLES and ser.in_waiting:
@@ -10,6 +10,7 @@ NUM_SAMPLES   = SAMPLE_RATE * RECORD_SECONDS
 PORT          = 'COM6'          # STM port
 BAUD_RATE     = 115200
 OUTPUT_WAV    = 'E14_Project.wav'
+STALL_SECONDS = 3                # give up after this many empty 1 s reads in a row
 # --------------------- #
 
 def record_and_save():
@@ -19,14 +20,20 @@ def record_and_save():
 
     data = bytearray()
     start = time.time()
+    empty_reads = 0
 
-    # keep calling read() until we get exactly NUM_SAMPLES
+    # keep calling read() until we get exactly NUM_SAMPLES, or the STM stops sending
     while len(data) < NUM_SAMPLES:
         to_read = NUM_SAMPLES - len(data)
         chunk = ser.read(to_read)
         if chunk:
             data.extend(chunk)
-        # else: read() timed out, but keep looping indefinitely
+            empty_reads = 0
+        else: # read() timed out
+            empty_reads += 1
+            if empty_reads >= STALL_SECONDS:
+                print(f"No data from the STM for {STALL_SECONDS} seconds, keeping what was captured")
+                break
 
     elapsed = time.time() - start
     ser.close()
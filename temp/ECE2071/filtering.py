@@ -4,15 +4,17 @@ import wave
 
 SAMPLE_RATE = 5000  # Hz
 
-# Load raw signal (assumed saved from ADC as 0–255 values)
-data = np.load("raw_signal.npy").astype(np.float32)
+# Load raw signal (assumed saved from ADC as 0–255 values). Memory mapping it means the saved array is not held
+# in memory next to the float32 copy below, but that copy and the FFT still need the whole signal in memory
+data = np.load("raw_signal.npy", mmap_mode="r")
 
 # --- STEP 1: Zero-center the signal ---
-data -= np.mean(data)  # Remove DC offset
+data = np.subtract(data, np.float32(np.mean(data, dtype=np.float64)), dtype=np.float32)  # Remove DC offset
 
 # --- STEP 2: Frequency-domain filtering ---
-fft_data = np.fft.fft(data)
-freqs = np.fft.fftfreq(len(data), 1 / SAMPLE_RATE)
+# The signal is real, so only the positive half of the spectrum is needed (half the memory of fft)
+fft_data = np.fft.rfft(data)
+freqs = np.fft.rfftfreq(len(data), 1 / SAMPLE_RATE)
 
 low_cutoff = 30    # Hz
 high_cutoff = 3000   # Hz
@@ -20,7 +22,7 @@ band_mask = (np.abs(freqs) > low_cutoff) & (np.abs(freqs) < high_cutoff)
 fft_data[~band_mask] = 0
 
 # --- STEP 3: Inverse FFT ---
-filtered = np.fft.ifft(fft_data).real
+filtered = np.fft.irfft(fft_data, len(data))
 
 # --- STEP 4: Normalize to 8-bit unsigned for WAV ---
 # First, normalize to [-1, 1] range
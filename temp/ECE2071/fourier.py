@@ -4,18 +4,19 @@ import matplotlib.pyplot as plt
 
 SAMPLE_RATE = 5000  # Hz — change if different
 
-# Load the raw signal
-data = np.load("raw_signal.npy").astype(np.float32)
+# Load the raw signal. Memory mapping it means the saved array is not held in memory next to the
+# float32 copy below, but that copy and the FFT still need the whole signal in memory
+data = np.load("raw_signal.npy", mmap_mode="r")
 
 # Remove DC offset
-signal = data - np.mean(data)
+signal = np.subtract(data, np.float32(np.mean(data, dtype=np.float64)), dtype=np.float32)
 
-# FFT
-fft_data = np.fft.fft(signal)
-freqs = np.fft.fftfreq(len(signal), 1 / SAMPLE_RATE)
+# FFT, the signal is real so only the positive half of the spectrum is computed
+fft_data = np.fft.rfft(signal)
+freqs = np.fft.rfftfreq(len(signal), 1 / SAMPLE_RATE)
 
 # Get magnitude (only positive frequencies)
-half_len = len(freqs) // 2
+half_len = len(signal) // 2
 magnitude = np.abs(fft_data[:half_len])
 freqs = freqs[:half_len]
 
@@ -4,7 +4,10 @@ import wave
 import serial
 import matplotlib.pyplot as plt
 import time
-import csv
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ECE2071_Final_Submission_E14"))
+from exporters import StreamingCsvWriter # same block CSV writer as the final submission
 
 data = []
 
@@ -17,15 +20,15 @@ for device in devices:
     if "STM32 STLink" in device.description:
         STM_device = device.device
 
-ser = serial.Serial(STM_device, BAUD_RATE, timeout=0.001)
+ser = serial.Serial(STM_device, BAUD_RATE, timeout=0.01)
 print(f"Connected to: {STM_device}")
 
 start_time = time.time()
 
-for _ in range(TIME_RANGE * SAMPLE_RATE):
-    byte = ser.read(1)
-    if byte:
-        data.append(byte[0])
+# Read whatever is queued (at least 10 ms worth) per call instead of one byte at a time
+while len(data) < TIME_RANGE * SAMPLE_RATE and time.time() - start_time < TIME_RANGE + 1:
+    to_read = max(ser.in_waiting, SAMPLE_RATE // 100)
+    data.extend(ser.read(min(to_read, TIME_RANGE * SAMPLE_RATE - len(data))))
 
 duration = time.time() - start_time
 ser.close()
@@ -62,10 +65,7 @@ plt.close()
 print("Waveform has been saved!!!")
 
 # Save raw data to CSV
-with open("raw_adc_dataWO.csv", 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["Index", "Raw_Value"])
-    for i, val in enumerate(data):
-        writer.writerow([i, val])
+with StreamingCsvWriter("raw_adc_dataWO.csv", header=("Index", "Raw_Value")) as csv_writer:
+    csv_writer.write(data)
 
 print("CSV of raw data has been saved!!!")
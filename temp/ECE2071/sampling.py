@@ -4,7 +4,10 @@ import wave
 import serial
 import matplotlib.pyplot as plt
 import time
-import csv
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "ECE2071_Final_Submission_E14"))
+from exporters import StreamingCsvWriter # same block CSV writer as the final submission
 
 
 # Settings
@@ -45,11 +48,8 @@ print(f"Collected {len(data)} samples in {duration:.2f} seconds.")
 data = np.array(data)
 
 # Save raw data to CSV
-with open("raw_adc_data.csv", 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["Index", "Raw_ADC_Value"])
-    for i, val in enumerate(data):
-        writer.writerow([i, val])
+with StreamingCsvWriter("raw_adc_data.csv", header=("Index", "Raw_ADC_Value")) as csv_writer:
+    csv_writer.write(data)
 print("Saved: raw_adc_data.csv")
 
 # Apply simple moving average filter